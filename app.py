@@ -3,6 +3,7 @@
 from application import create_app
 from application.extensions import db
 from application.database.init_db import create_admin
+from application.services import stats
 from flask.cli import with_appcontext
 import click
 
@@ -10,15 +11,31 @@ app = create_app()
 
 @app.shell_context_processor
 def _shell_context():
-    from application.database import User, ParkingLot, ParkingSpot, Reservation
-    return dict(db=db, User=User, ParkingLot=ParkingLot, ParkingSpot=ParkingSpot, Reservation=Reservation)
+    from application.database import User, ParkingLot, ParkingSpot, Reservation, ReservationArchive, SystemStats
+    return dict(db=db, User=User, ParkingLot=ParkingLot, ParkingSpot=ParkingSpot, Reservation=Reservation,
+                ReservationArchive=ReservationArchive, SystemStats=SystemStats)
 
 
 # Example custom CLI: flask seed
 @click.command("seed")
+@click.option("--lots", type=int, default=None, help="Bulk mode: number of lots (e.g. 10000).")
+@click.option("--spots", type=int, default=50, show_default=True, help="Spots per lot in bulk mode.")
+@click.option("--users", type=int, default=10_000, show_default=True, help="Users in bulk mode.")
+@click.option("--reservations", type=int, default=100_000, show_default=True, help="Reservations in bulk mode.")
+@click.option("--ongoing", type=float, default=0.05, show_default=True, help="Share of reservations still parked.")
+@click.option("--days", type=int, default=365, show_default=True, help="Reservation history spans this many days.")
+@click.option("--chunk-size", type=int, default=50_000, show_default=True, help="Rows per insert transaction.")
+@click.option("--random-seed", type=int, default=None, help="Make the generated data reproducible.")
 @with_appcontext
-def seed():
-    create_admin(app)
+def seed(lots, spots, users, reservations, ongoing, days, chunk_size, random_seed):
+    # without --lots: the small demo data, with it: a load test database (database/seed.py)
+    if lots is None:
+        create_admin(app)
+        stats.reconcile()
+        return
+    from application.database import seed as bulk
+
+    bulk.seed(lots, spots, users, reservations, ongoing, days, random_seed, chunk_size)
 
 
 @click.command("clear-data")
@@ -35,6 +52,69 @@ def clear_data():
     click.echo("all tables cleared successfully")
 
 
+@click.command("reconcile-stats")
+@with_appcontext
+def reconcile_stats():
+    # meant to be run periodically (cron) to correct any drift in the admin summary numbers
+    drift = stats.reconcile()
+    for column, (stored, actual) in drift.items():
+        click.echo(f"{column}: {stored} -> {actual}")
+    click.echo("system stats reconciled" + (f", fixed {len(drift)} columns" if drift else ", no drift"))
+
+
+@click.command("backfill-costs")
+@with_appcontext
+def backfill_costs():
+    from application.services.allocation import backfill_final_costs
+
+    click.echo(f"final cost stored for {backfill_final_costs()} completed reservations")
+
+
+@click.command("archive-reservations")
+@click.option("--days", type=int, default=None, help="Archive completed reservations older than this (RESERVATION_ARCHIVE_DAYS).")
+@click.option("--batch-size", type=int, default=None, help="Rows moved per transaction (RESERVATION_ARCHIVE_BATCH).")
+@with_appcontext
+def archive_reservations(days, batch_size):
+    # meant for cron, keeps the hot reservation table small
+    from application.services import archive
+
+    moved = archive.archive_completed(days, batch_size)
+    click.echo(f"moved {moved} completed reservations to the archive")
+
+
+@click.command("fts-rebuild")
+@with_appcontext
+def fts_rebuild():
+    from application.services import fulltext
+
+    if db.engine.dialect.name != "sqlite":
+        raise click.ClickException("fts-rebuild manages SQLite FTS5 tables and only supports sqlite")
+    fulltext.rebuild(db.session.connection())
+    db.session.commit()
+    click.echo(f"rebuilt the full-text indexes: {', '.join(fulltext.INDEXES)}")
+
+
+@click.command("index-audit")
+@click.option("--verbose", "-v", is_flag=True, help="Print the full query plan of every hot query.")
+@with_appcontext
+def index_audit(verbose):
+    from application.services import index_audit as auditor
+
+    if db.engine.dialect.name != "sqlite":
+        raise click.ClickException("index-audit reads EXPLAIN QUERY PLAN and only supports sqlite")
+
+    failed = 0
+    for name, plan, scans in auditor.audit():
+        click.echo(f"{'FULL SCAN' if scans else 'ok':>9}  {name}")
+        for line in (plan if verbose else scans):
+            click.echo(f"{'':>11}{line}")
+        failed += bool(scans)
+
+    if failed:
+        raise click.ClickException(f"{failed} hot queries degrade to a full scan")
+    click.echo("all hot queries are index backed")
+
+
 @click.command("drop-all")
 @with_appcontext
 def drop_all():
@@ -45,6 +125,11 @@ def drop_all():
 app.cli.add_command(clear_data)
 app.cli.add_command(seed)
 app.cli.add_command(drop_all)
+app.cli.add_command(reconcile_stats)
+app.cli.add_command(index_audit)
+app.cli.add_command(backfill_costs)
+app.cli.add_command(archive_reservations)
+app.cli.add_command(fts_rebuild)
 
 if __name__ == "__main__":
     app.run(debug=True)
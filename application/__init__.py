@@ -2,17 +2,17 @@
 from flask import Flask, url_for, redirect
 from .config import DevConfig
 # from .extensions import db, migrate, login_manager
-from .extensions import db, login_manager
+from .extensions import db, login_manager, init_sqlite_pragmas
 from .auth import auth_bp
 from .user import user_bp
 from .admin import admin_bp
 from .main import main_bp
-from .database.models import User
+from .services import user_cache, sql_monitor, analytics, lot_search, fragment_cache, conditional, avatars, read_routing, metrics, credentials
 import os
 
 
 def create_app(config_object=DevConfig):
-    app = Flask(__name__, template_folder="templates", static_folder="../static") # it won't be used as each bp have its own template folder.
+    app = Flask(__name__, template_folder="templates", static_folder="../static") # only shared partials live here, each bp have its own template folder.
 
     app.config.from_object(config_object)
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -22,6 +22,17 @@ def create_app(config_object=DevConfig):
         return redirect(url_for('static', filename='favicon.ico'))
 
     db.init_app(app)
+    init_sqlite_pragmas(app)
+    metrics.init_app(app)
+    user_cache.init_app(app)
+    sql_monitor.init_app(app)
+    analytics.init_app(app)
+    lot_search.init_app(app)
+    fragment_cache.init_app(app)
+    conditional.init_app(app)
+    avatars.init_app(app)
+    read_routing.init_app(app)
+    credentials.init_app(app)
     login_manager.init_app(app)
     # migrate.init_app(app, db)
 
@@ -33,10 +44,10 @@ def create_app(config_object=DevConfig):
     return app  
 
 
-# User loader
+# User loader, served from services.user_cache so most requests don't touch the user table
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.load(int(user_id))
 
 
 # print("running form application/__init__")
\ No newline at end of file
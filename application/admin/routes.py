@@ -1,4 +1,4 @@
-from flask import render_template, flash, redirect, url_for, current_app, request
+from flask import render_template, flash, redirect, url_for, current_app, request, abort, Response, stream_with_context, jsonify
 from flask_login import current_user, login_required
 
 from functools import wraps
@@ -7,9 +7,11 @@ import datetime
 from sqlalchemy import asc, desc, func
 
 from . import admin_bp
-from ..database.models import User, ParkingLot, ParkingSpot, Reservation
+from ..database.models import User, ParkingLot, ParkingSpot
 from .admin_forms import LotForm, EditProfileForm
 from ..extensions import db
+from ..services import stats, provisioning, availability, export, analytics, archive, fulltext, fragment_cache, conditional, read_routing, pool_metrics, queries
+from ..services.pagination import paginate
 
 
 def role_required(role):
@@ -35,15 +37,16 @@ def role_required(role):
 @login_required
 @role_required('admin')
 def dashboard():
-    # Get the first 5 lots for the dashboard overview
-    lots = ParkingLot.query.order_by(ParkingLot.name).limit(5).all()
+    # First 5 lots for the dashboard overview, cached until a lot changes
+    lot_cards = fragment_cache.render('admin/_lot_cards.html', (), lambda: dict(
+        lots=ParkingLot.query.order_by(ParkingLot.name).limit(5).all()))
 
     # Get the 5 most recent users (by creation date)
     users = User.query.order_by(User.created_at.desc()).limit(5).all()
 
     return render_template(
         'admin/admin_dashboard.html',
-        lots=lots,
+        lot_cards=lot_cards,
         users=users
     )
 
@@ -55,20 +58,27 @@ def profile():
     return render_template('admin/admin_profile_view.html', user=current_user)
 
 
+def _summary_stamp():
+    return conditional.stats_stamp(), conditional.lots_stamp()
+
+
 @admin_bp.route('/summary')
 @login_required
 @role_required('admin')
+@read_routing.read_only
+@conditional.etag(_summary_stamp)
 def admin_summary():
     """
     Admin summary dashboard with system-wide statistics and charts
     """
-    # Meta information for the top section
-    total_users = User.query.count()
-    active_users = User.query.filter(User.active_parking > 0).count()
-    total_lots = ParkingLot.query.count()
-    active_lots = ParkingLot.query.filter_by(is_active=True).count()
-    total_system_revenue = db.session.query(func.sum(ParkingLot.total_revenue)).scalar() or 0
-    total_reservations = Reservation.query.count()
+    # Meta information for the top section, read from the precomputed stats row
+    system_stats = stats.get_stats()
+    total_users = system_stats.total_users
+    active_users = system_stats.active_users
+    total_lots = system_stats.total_lots
+    active_lots = system_stats.active_lots
+    total_system_revenue = system_stats.total_revenue or 0
+    total_reservations = system_stats.total_reservations
 
     # Data for the revenue bar chart (Lot vs Revenue)
     lot_revenue_data = db.session.query(
@@ -86,8 +96,8 @@ def admin_summary():
     ]
 
     # Data for the pie chart (Occupied vs Free spots)
-    total_spots = db.session.query(func.sum(ParkingLot.max_spots)).scalar() or 0
-    occupied_spots = db.session.query(func.sum(ParkingLot.max_spots - ParkingLot.available_spots)).scalar() or 0
+    total_spots = system_stats.total_spots
+    occupied_spots = system_stats.occupied_spots
     free_spots = total_spots - occupied_spots
 
     spots_data = {
@@ -110,51 +120,137 @@ def admin_summary():
     )
 
 
+def _analytics_stamp():
+    # a new bucket or any booking / checkout (the stats counters) changes the series
+    window = request.args.get('window', '24h')
+    if window not in analytics.WINDOWS:
+        return None
+    return analytics.window_bounds(window)[1], conditional.stats_stamp()
+
+
+@admin_bp.route('/analytics')
+@login_required
+@role_required('admin')
+@read_routing.read_only
+@conditional.etag(_analytics_stamp)
+def lot_analytics():
+    """Revenue / occupancy time series for ?window=24h|7d|30d|90d, optionally only for ?lot=<id> (repeatable)."""
+    window = request.args.get('window', '24h')
+    if window not in analytics.WINDOWS:
+        abort(400, f"window must be one of {', '.join(analytics.WINDOWS)}")
+    return jsonify(analytics.get(window, request.args.getlist('lot', type=int)))
+
+
+@admin_bp.route('/search')
+@login_required
+@role_required('admin')
+def search():
+    """Ranked full-text search over users and lots, ?q=<words>&kind=users|lots|all, ?format=json for the raw matches."""
+    q = request.args.get('q', '').strip()
+    kind = request.args.get('kind', 'all')
+    users = fulltext.search_users(q) if kind in ('all', 'users') else []
+    lots = fulltext.search_lots(q) if kind in ('all', 'lots') else []
+
+    if request.args.get('format') == 'json':
+        return jsonify(
+            users=[dict(id=u.id, username=u.username, name=u.name, email=u.email, phone=u.phone) for u in users],
+            lots=[dict(id=l.id, name=l.name, address=l.address, pincode=l.pincode) for l in lots],
+        )
+    return render_template('admin/search_results.html', q=q, kind=kind, users=users, lots=lots)
+
+
+@admin_bp.route('/fragment_cache')
+@login_required
+@role_required('admin')
+def fragment_cache_metrics():
+    """Hit / miss / eviction counts of this worker's rendered fragment cache."""
+    return jsonify(fragment_cache.metrics())
+
+
+@admin_bp.route('/pool')
+@login_required
+@role_required('admin')
+def pool_metrics_view():
+    """Connection pool occupancy and checkout wait times of this worker, per engine."""
+    return jsonify(pool_metrics.metrics())
+
+
+def _date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        abort(400, f"'{name}' must be a date like 2025-01-31")
+
+
+@admin_bp.route('/export/reservations')
+@login_required
+@role_required('admin')
+@read_routing.read_only
+def export_reservations():
+    """
+    Reservation history as ?format=csv (default) or ndjson, streamed in constant memory.
+    Optional filters: ?from=YYYY-MM-DD&to=YYYY-MM-DD on the start date (both inclusive) and ?lot=<id> (repeatable).
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in export.FORMATS:
+        abort(400, f"format must be one of {', '.join(export.FORMATS)}")
+    start, end = _date_arg('from'), _date_arg('to')
+    if end is not None:
+        end += datetime.timedelta(days=1)
+
+    stmt = export.export_stmt(start, end, request.args.getlist('lot', type=int))
+    filename = f"reservations-{datetime.date.today().isoformat()}.{fmt}"
+    return Response(
+        stream_with_context(export.stream(fmt, stmt)), mimetype=export.FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"', 'X-Accel-Buffering': 'no'},
+    )
+
+
+# sort option -> keyset column, nullable columns are coalesced so the seek condition never sees NULL
+LOT_SORT_KEYS = {
+    'name': ParkingLot.name,
+    'pincode': ParkingLot.pincode,
+    'spots': ParkingLot.available_spots,
+    'price': ParkingLot.cost_per_hour,
+    'revenue': func.coalesce(ParkingLot.total_revenue, 0),
+}
+
+USER_SORT_KEYS = {
+    'id': User.id,
+    'username': User.username,
+    'email': User.email,
+    'total_parking': func.coalesce(User.total_parking, 0),
+}
+
+
 @admin_bp.route('/all_lots')
 @login_required
 @role_required('admin')
+@read_routing.read_only
+@conditional.etag(conditional.lots_stamp)
 def all_lots():
     sort = request.args.get('sort', 'name')
     order = request.args.get('order', 'asc')
 
-    lots_query = ParkingLot.query
-
-    if sort == 'name':
-        lots_query = lots_query.order_by(
-            asc(ParkingLot.name) if order == 'asc' else desc(ParkingLot.name)
-        )
-    elif sort == 'pincode':
-        lots_query = lots_query.order_by(
-            asc(ParkingLot.pincode) if order == 'asc' else desc(ParkingLot.pincode)
-        )
-    elif sort == 'spots':
-        lots_query = lots_query.order_by(
-            asc(ParkingLot.available_spots) if order == 'asc' else desc(ParkingLot.available_spots)
-        )
-    elif sort == 'price':
-        lots_query = lots_query.order_by(
-            asc(ParkingLot.cost_per_hour) if order == 'asc' else desc(ParkingLot.cost_per_hour)
-        )
-    elif sort == 'revenue':
-        lots_query = lots_query.order_by(
-            asc(ParkingLot.total_revenue) if order == 'asc' else desc(ParkingLot.total_revenue)
-        )
-    else:
-        lots_query = lots_query.order_by(asc(ParkingLot.name))
+    if sort not in LOT_SORT_KEYS:
+        sort = 'name'
+    cursor, per_page = request.args.get('cursor'), request.args.get('per_page')
 
-    lots = lots_query.all()
+    def build():
+        page = paginate(ParkingLot.query, LOT_SORT_KEYS[sort], ParkingLot.id, order, cursor=cursor, per_page=per_page)
+        return dict(lots=page.items, page=page, sort=sort, order=order)
 
-    return render_template(
-        'admin/all_lots.html',
-        lots=lots,
-        sort=sort,
-        order=order
-    )
+    lot_list = fragment_cache.render('admin/_lot_list.html', (sort, order, cursor, per_page), build)
+    return render_template('admin/all_lots.html', lot_list=lot_list)
 
 
 @admin_bp.route('/view_lot_details/<int:lot_id>')
 @login_required
 @role_required('admin')
+@conditional.etag(conditional.lot_stamp)
 def view_lot_details(lot_id):
     # Get sort and order parameters from the request URL
     sort = request.args.get('sort', 'spot_number')  # Default sort by spot_number
@@ -203,7 +299,7 @@ def view_lot_details(lot_id):
 @admin_bp.route('/details_reservation/<int:reservation_id>')
 def details_reservation(reservation_id):
 
-    reservation = db.session.get(Reservation, int(reservation_id))
+    reservation = archive.get(int(reservation_id))
     print(reservation)
     return render_template('admin/show_reservation_details.html', reservation=reservation)
 
@@ -227,17 +323,9 @@ def add_lot():
             db.session.add(new_lot)
             db.session.flush()  # flush so new_lot gets an ID without committing
 
-            # Create ParkingSpot entries for this lot
-            spot = None                 # to avoid name error if range is impossible
-            for i in range(1, new_lot.max_spots + 1):
-                spot = ParkingSpot(
-                    spot_number=i,
-                    lot_id=new_lot.id,
-                    status="A",  # default: Available
-                    total_parking=0
-                )
-                if spot:
-                    db.session.add(spot)
+            # Create ParkingSpot entries for this lot in one executemany
+            provisioning.add_spots(new_lot.id, range(1, new_lot.max_spots + 1))
+            stats.bump(total_lots=1, active_lots=1, total_spots=new_lot.max_spots)
             db.session.commit()
             flash("New Parking lot added!", "success")
             return redirect(url_for('admin.dashboard'))
@@ -269,52 +357,26 @@ def edit_lot(lot_id):
         lot.updated_at = datetime.datetime.utcnow()
 
         if new_max > old_max:
-            # Add new spots
-            # Step 1: Fetch all existing spot_numbers in one query
-            existing_spots = db.session.query(ParkingSpot.spot_number).filter_by(lot_id=lot_id).all()
-            existing_numbers = set(num for (num,) in existing_spots)
-
-            # Step 2: Determine next k available spot numbers (fill gaps first)
-            new_spots = []
-            candidate = 1
-            k = new_max - old_max
-
-            while len(new_spots) < k:
-                if candidate not in existing_numbers:
-                    new_spots.append(candidate)
-                candidate += 1
-
-            # Step 3: Add all new spot objects in batch
-            for spot_number in new_spots:
-                spot = ParkingSpot(
-                    lot_id=lot_id,
-                    spot_number=spot_number,
-                    status="A",
-                    total_parking=0
-                )
-                db.session.add(spot)
-
-            lot.available_spots += k
+            # Add new spots, gaps in the numbering are filled first
+            added = provisioning.grow_lot(lot_id, new_max - old_max)
+            lot.available_spots = ParkingLot.available_spots + added       # in sql, parallel bookings move it too
 
         elif new_max < old_max:
-            # Handle spot removal only if the excess spots are available
-            removable_spots = ParkingSpot.query.filter_by(lot_id=lot.id, status='A').limit(old_max - new_max).all()
-            # since we are using limit removable spot is always in safe range.
-
-            if len(removable_spots) >= (old_max - new_max):      # this check is just to flash invalid shrink
-                for spot in removable_spots:
-                    db.session.delete(spot)
-                lot.available_spots -= len(removable_spots)
-
-            else:
+            # Remove free spots only, a single conditional delete never touches an occupied one
+            try:
+                removed = provisioning.shrink_lot(lot_id, old_max - new_max)
+                lot.available_spots = ParkingLot.available_spots - removed
+            except provisioning.SpotsOccupied as e:
                 db.session.rollback()
-                flash("Cannot reduce max spots: Some of the extra spots are currently occupied.", "danger")
+                flash(str(e), "danger")
                 return render_template("admin/edit_lot.html", form=form, lot=lot)
 
         lot.max_spots = new_max
+        stats.bump(total_spots=new_max - old_max)
 
         try:
             db.session.commit()
+            availability.publish(lot.id, lot.available_spots, lot.is_active)
             flash(f"Lot '{lot.name}' updated successfully.", "success")
             return redirect(url_for("admin.dashboard"))  # redirect to listing page
         except Exception as e:
@@ -333,13 +395,17 @@ def deactivate_lot(lot_id):
     try:
         if lot.is_active:
             lot.is_active = False
+            stats.bump(active_lots=-1)
             db.session.commit()
+            availability.publish(lot.id, lot.available_spots, lot.is_active)
             flash(f"Lot '{lot.name}' deactivated successfully.", "success")
             return redirect(url_for("admin.dashboard"))
 
         else:
             lot.is_active = True
+            stats.bump(active_lots=1)
             db.session.commit()
+            availability.publish(lot.id, lot.available_spots, lot.is_active)
             flash(f"Lot '{lot.name}' has been activated again.", "success")
             return redirect(url_for("admin.view_lot_details", lot_id=lot_id))
 
@@ -355,41 +421,25 @@ def deactivate_lot(lot_id):
 @admin_bp.route('/all_users')
 @login_required
 @role_required('admin')
+@read_routing.read_only
 def all_users():
     # Get sort and order parameters from the request URL
     sort = request.args.get('sort', 'username')  # Default sort by username
     order = request.args.get('order', 'asc')  # Default ascending order
 
-    # Base query for all users
-    users_query = User.query
-
-    # Apply sorting based on the 'sort' parameter
-    if sort == 'id':
-        users_query = users_query.order_by(
-            asc(User.id) if order == 'asc' else desc(User.id)
-        )
-    elif sort == 'username':
-        users_query = users_query.order_by(
-            asc(User.username) if order == 'asc' else desc(User.username)
-        )
-    elif sort == 'email':
-        users_query = users_query.order_by(
-            asc(User.email) if order == 'asc' else desc(User.email)
-        )
-    elif sort == 'total_parking':
-        users_query = users_query.order_by(
-            asc(User.total_parking) if order == 'asc' else desc(User.total_parking)
-        )
-    else:
+    if sort not in USER_SORT_KEYS:
         # Default fallback to username if invalid sort parameter
-        users_query = users_query.order_by(asc(User.username))
+        sort = 'username'
 
-    # Get all users with the applied sorting
-    users = users_query.all()
+    page = paginate(
+        User.query, USER_SORT_KEYS[sort], User.id, order,
+        cursor=request.args.get('cursor'), per_page=request.args.get('per_page'),
+    )
 
     return render_template(
         'admin/all_users.html',
-        users=users,
+        users=page.items,
+        page=page,
         sort=sort,
         order=order
     )
@@ -409,7 +459,7 @@ def deactivate_user(user_id):
     user = User.query.get_or_404(user_id)
 
     # Check for active reservations
-    has_active_reservation = Reservation.query.filter_by(user_id=user.id, status='O').first() is not None
+    has_active_reservation = db.session.scalar(queries.active_reservation_stmt(user.id)) is not None
 
     if has_active_reservation:
         flash(f"Cannot deactivate '{user.username}' — active reservations found.", "warning")
@@ -1,5 +1,3 @@
-from datetime import datetime
-
 from flask import render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required
 from sqlalchemy.sql.functions import current_user
@@ -7,7 +5,7 @@ from sqlalchemy.sql.functions import current_user
 from . import auth_bp  # importing the Blueprint object
 from ..database.models import User
 from ..extensions import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from ..services import stats, metrics, credentials
 from .forms import ForgotPasswordForm, LoginForm, RegisterForm
 
 
@@ -22,46 +20,20 @@ def login():
     elif request.method == "POST":
         form = LoginForm()
         if form.validate_on_submit():
-            id_type = form.id_type.data
-            id_value = form.id_value.data
-            password = form.password.data
-
-            if id_type == "username":
-                user = User.query.filter_by(username=id_value).first()
-                if user and check_password_hash(user.password, password) and user.is_active:
-                    login_user(user)
-                    user.last_login = datetime.utcnow()
-                    db.session.add(user)
-                    db.session.commit()
-                    return redirect(url_for('user.dashboard' if user.role=='user' else 'admin.dashboard'))
-                else:
-                    flash("Invalid Credentials")
-                    return redirect(url_for('auth.login'))
-
-            elif id_type == "email":
-                user = User.query.filter_by(email=id_value).first()
-                if user and check_password_hash(user.password, password) and user.is_active:
-                    login_user(user)
-                    user.last_login = datetime.utcnow()
-                    db.session.add(user)
-                    db.session.commit()
-                    return redirect(url_for('admin.dashboard' if user.role=='admin' else 'user.dashboard'))
-                else:
-                    flash("Invalid Credentials")
-                    return redirect(url_for('auth.login'))
-
-            elif id_type == "phone":
-                user = User.query.filter_by(phone=id_value).first()
-                if user and check_password_hash(user.password, password) and user.is_active:
-                    login_user(user)
-                    user.last_login = datetime.utcnow()
-                    db.session.add(user)
-                    db.session.commit()
-                    return redirect(url_for('admin.dashboard' if user.role=='admin' else 'user.dashboard'))
-                else:
-                    flash("Invalid Credentials")
-                    return redirect(url_for('auth.login'))
+            # one indexed lookup whichever id was given, see services.credentials
+            user = credentials.find(form.id_type.data, form.id_value.data)
+            if credentials.verify(user, form.password.data) and user.is_active:
+                login_user(user)
+                credentials.record_login(user.id)
+                db.session.commit()         # writes only a rehashed password, last_login is buffered
+                metrics.login("success")
+                return redirect(url_for('admin.dashboard' if user.role == 'admin' else 'user.dashboard'))
+            else:
+                metrics.login("failure")
+                flash("Invalid Credentials")
+                return redirect(url_for('auth.login'))
         else:
+            metrics.login("invalid")
             flash("Validation Failed! Invalid Credentials")
             return redirect(url_for('auth.login'))
 
@@ -92,11 +64,12 @@ def register():
             flash("Phone already exists", "danger")
         else:
             try:
-                password_hash = generate_password_hash(password)
+                password_hash = credentials.hash_password(password)
                 user = User(username=username, email=email, phone=phone,
                             name=name, gender=gender, address=address,
                             pincode=pincode, password=password_hash)
                 db.session.add(user)
+                stats.bump(total_users=1)
                 db.session.commit()
                 flash("User created successfully. Please log in.", "success")
                 return redirect(url_for('auth.login'))
@@ -136,7 +109,7 @@ def forgot():
         user = User.query.filter_by(username=username).first()
 
         if user and user.email == email and user.is_active:
-            user.password = generate_password_hash(new_password)
+            user.password = credentials.hash_password(new_password)
             db.session.commit()
             flash("Password reset successful!", "success")
             return redirect(url_for('auth.login'))
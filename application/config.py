@@ -1,6 +1,9 @@
 import os
 from pathlib import Path
 from dotenv import load_dotenv
+from sqlalchemy.pool import NullPool
+
+from .extensions import MeteredQueuePool
 
 load_dotenv('.env')
 
@@ -11,15 +14,120 @@ TEMPLATE_DIR = APP_DIR / "templates"
 INSTANCE_DIR = BASE_DIR / "instance"
 LOGS_DIR = BASE_DIR / "logs"
 
+# PRAGMAs run on every new sqlite connection (see extensions.set_sqlite_pragma), in this order.
+# busy_timeout goes first so that switching the journal mode waits for other connections instead of failing.
+# Read-only connections (the replica bind) skip journal_mode, see extensions.read_only_pragmas.
+SQLITE_PROFILES = {
+    # what sqlite does out of the box, only foreign keys turned on
+    "default": {
+        "foreign_keys": "ON",
+    },
+    # for several gunicorn workers on one db file
+    "tuned": {
+        "busy_timeout": 5000,           # ms to wait for a lock before raising "database is locked"
+        "journal_mode": "WAL",          # readers no longer wait for writers (persisted in the db file)
+        "synchronous": "NORMAL",        # safe with WAL, only fsyncs on checkpoints
+        "foreign_keys": "ON",
+        "cache_size": -64000,           # negative is KiB, so ~64MB page cache per connection
+        "mmap_size": 268435456,         # read pages straight from a 256MB memory map
+        "temp_store": "MEMORY",         # sorts and temp b-trees stay off the disk
+    },
+}
+
+
+def sqlite_read_only(path):
+    """A second, read-only connection to the same sqlite file (SQLALCHEMY_BINDS["replica"], see services.read_routing)."""
+    return f"sqlite:///file:{path}?mode=ro&uri=true"
+
+
+def engine_options(url):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS with per backend pool defaults (binds need them in their own dict), each can be
+    overridden from the environment: DB_POOL=queue|null, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE, DB_POOL_PRE_PING=0|1.
+
+    A sqlite file keeps a small pool rather than NullPool, the pragmas and the page cache of SQLITE_PRAGMAS
+    live per connection. Postgres / MySQL get a bigger pool, recycle connections before server side idle
+    timeouts and ping them on checkout. In-memory sqlite is left alone, Flask-SQLAlchemy gives it a StaticPool.
+    """
+    if not url or url in ("sqlite://", "sqlite:///:memory:"):
+        return {}
+    if os.environ.get("DB_POOL", "queue") == "null":
+        return {"poolclass": NullPool}
+    sqlite = url.startswith("sqlite")
+    return {
+        "poolclass": MeteredQueuePool,
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 5 if sqlite else 10)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 10 if sqlite else 20)),
+        "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", 10 if sqlite else 30)),      # seconds
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", -1 if sqlite else 1800)),    # seconds, -1 never
+        "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "0" if sqlite else "1") == "1",
+    }
+
+
+def replica_bind(url):
+    """SQLALCHEMY_BINDS with the read-only "replica" engine and its pool options, empty without a url."""
+    return {"replica": {"url": url, **engine_options(url)}} if url else {}
+
 
 class Config:
     SECRET_KEY = "dev-secret"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLITE_PRAGMAS = SQLITE_PROFILES[os.environ.get("SQLITE_PROFILE", "tuned")]
+    # load_user cache, in-process LRU unless a redis url is given (see services.user_cache). The LRU only drops
+    # entries in the worker which made the change: with several workers a deactivation (is_active) or a booking
+    # made elsewhere (active_parking) shows up after at most USER_CACHE_TTL, set USER_CACHE_URL to share it
+    USER_CACHE_URL = os.environ.get("USER_CACHE_URL")
+    USER_CACHE_SIZE = 1024
+    USER_CACHE_TTL = 60             # seconds
+    # per request statement count / db time / repeated statements, see services.sql_monitor
+    SQL_INSTRUMENTATION = False
+    SQL_QUERY_WARN = 20             # log requests running more statements than this
+    SQL_REPEAT_WARN = 5             # log requests running one statement this many times (N+1)
+    SQL_DEBUG_ENDPOINT = False      # /debug/sql with the last SQL_HISTORY requests
+    SQL_HISTORY = 50
+    # admin time series (services.analytics), cached per window
+    ANALYTICS_CACHE_SIZE = 64
+    ANALYTICS_CACHE_TTL = 60        # seconds
+    # in-memory lot search (services.lot_search), rebuilt on lot changes and at least this often
+    LOT_SEARCH_TTL = 300            # seconds
+    # rendered lot listings / dashboard lot cards (services.fragment_cache)
+    FRAGMENT_CACHE_SIZE = 256
+    FRAGMENT_CACHE_TTL = 30         # seconds, only bounds memory: fragments are keyed by the lots' db version
+    # conditional GET (services.conditional): salt the ETags per deploy, max-age of static files
+    ETAG_SALT = os.environ.get("ETAG_SALT", "")
+    STATIC_MAX_AGE = 3600           # seconds, app and blueprint static
+    UPLOADS_MAX_AGE = 60            # old avatar uploads, replaced under the same name
+    # avatar processing (services.avatars), thumbnails are square JPEGs, the first size is the profile picture
+    AVATAR_WORKERS = 2              # 0 processes inline
+    AVATAR_SIZES = (256, 64)
+    AVATAR_MAX_BYTES = 5 * 1024 * 1024
+    AVATAR_MAX_PIXELS = 40_000_000
+    # completed reservations older than this move to reservation_archive (flask archive-reservations)
+    RESERVATION_ARCHIVE_DAYS = 180
+    RESERVATION_ARCHIVE_BATCH = 5000
+    # listing / reporting views read from SQLALCHEMY_BINDS["replica"] when set (services.read_routing),
+    # a browser that just wrote reads from the primary for this long so it sees its own change despite replica lag
+    READ_REPLICA_STICKY = 5         # seconds
+    # Prometheus /metrics (services.metrics), PROMETHEUS_MULTIPROC_DIR in the environment sums all gunicorn workers
+    METRICS_ENABLED = True
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")     # scrapes need "Authorization: Bearer <token>" when set
+    # password KDF (services.credentials), hashes made with other parameters are upgraded on the next login
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")    # werkzeug's scrypt:32768:8:1
+    PASSWORD_SALT_LENGTH = 16
+    # last_login is buffered per worker and written in batches, 0 writes it with the login
+    LAST_LOGIN_FLUSH_INTERVAL = 30  # seconds
+    LAST_LOGIN_BATCH = 1000
     # SQLALCHEMY_ECHO = True
 
 class DevConfig(Config):
     DEBUG = True
+    STATIC_MAX_AGE = 0              # always revalidate while editing
+    SQL_INSTRUMENTATION = True
+    SQL_DEBUG_ENDPOINT = True
     SQLALCHEMY_DATABASE_URI = f"sqlite:///{INSTANCE_DIR / 'database.sqlite3'}"
+    SQLALCHEMY_BINDS = replica_bind(sqlite_read_only(INSTANCE_DIR / 'database.sqlite3'))
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
     SECRET_KEY = os.environ.get("SECRET_KEY")
     UPLOAD_FOLDER = os.environ.get("UPLOAD_FOLDER")
 
@@ -27,7 +135,11 @@ class DevConfig(Config):
 class ProdConfig(Config):
     DEBUG = False
     SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL")
+    # a streaming replica of DATABASE_URL, or sqlite_read_only(<path>) for a sqlite primary
+    SQLALCHEMY_BINDS = replica_bind(os.environ.get("DATABASE_REPLICA_URL"))
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
 
 class TestConfig(Config):
     TESTING = True
+    SQL_INSTRUMENTATION = True
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
\ No newline at end of file
@@ -1,3 +1,3 @@
-from .models import User, ParkingLot, ParkingSpot, Reservation
+from .models import User, ParkingLot, ParkingSpot, Reservation, ReservationArchive, SystemStats
 
-__all__ = ['User', 'ParkingLot', 'ParkingSpot', 'Reservation']
+__all__ = ['User', 'ParkingLot', 'ParkingSpot', 'Reservation', 'ReservationArchive', 'SystemStats']
@@ -3,8 +3,11 @@ from sqlite3 import IntegrityError
 from flask_login import UserMixin
 from datetime import datetime
 from math import ceil
-from sqlalchemy import CheckConstraint, event
+from sqlalchemy import CheckConstraint, event, Float, Integer, case, cast, func
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import validates, foreign
+from sqlalchemy.sql.expression import FunctionElement
 
 from application.extensions import db
 
@@ -47,6 +50,9 @@ class User(UserMixin, db.Model):
         CheckConstraint("active_parking >= 0", name="check_active_parking_non_negative"),
         CheckConstraint("total_parking >= 0", name="check_total_parking_non_negative"),
         CheckConstraint("total_parking >= active_parking", name="check_total_gt_active"),
+        # login matches usernames and emails case insensitively (services.credentials.lookup_stmt)
+        db.Index("ix_user_username_lower", func.lower(username)),
+        db.Index("ix_user_email_lower", func.lower(email)),
     )
 
     # methods
@@ -103,12 +109,14 @@ class ParkingSpot(db.Model):
 
     # spot details
     spot_number= db.Column(db.Integer, nullable=False, index=True)
-    status = db.Column(db.String(1), default="A", nullable=False, index=True)
+    status = db.Column(db.String(1), default="A", nullable=False)
     total_parking = db.Column(db.Integer, nullable=False, default=0)            # total parking of all time
 
     # constraints
     __table_args__ = (
         db.UniqueConstraint("lot_id", "spot_number", name="uix_lot_spot_number"),
+        # free spot lookup (book_lot claim, edit_lot shrink): lot_id + status, already ordered by spot_number
+        db.Index("ix_spot_lot_status_number", "lot_id", "status", "spot_number"),
         CheckConstraint("spot_number>= 0", name="check_spot_number_non_negative"),
         CheckConstraint("status IN ('O', 'A')", name="check_status"),
         CheckConstraint("total_parking >= 0", name="check_total_parking_non_negative"),
@@ -116,7 +124,7 @@ class ParkingSpot(db.Model):
     # week relational attribute
     reservation_id = db.Column(db.Integer, nullable=True, index=True)
     # foreign keys and relationships
-    lot_id = db.Column(db.Integer, db.ForeignKey("parking_lot.id"), nullable=False, index=True)
+    lot_id = db.Column(db.Integer, db.ForeignKey("parking_lot.id"), nullable=False)      # covered by uix_lot_spot_number
     lot = db.relationship("ParkingLot", back_populates="spots")
 
     # methods
@@ -133,6 +141,40 @@ def prevent_delete_if_occupied(mapper, connection, target):
         print("from 134")
         raise IntegrityError(None, None, "Cannot delete an occupied spot.")
 
+class hours_between(FunctionElement):
+    """SQL: fractional hours from the first datetime argument to the second one."""
+    type = Float()
+    inherit_cache = True
+
+
+@compiles(hours_between)
+def _hours_between_sqlite(element, compiler, **kw):
+    start, end = (compiler.process(arg, **kw) for arg in element.clauses)
+    # julianday() is a float of days, whole hours come back as 1.0000000x, rounding to ms keeps them exact for ceil
+    return f"(round((julianday({end}) - julianday({start})) * 86400, 3) / 3600)"
+
+
+@compiles(hours_between, "postgresql")
+def _hours_between_postgresql(element, compiler, **kw):
+    start, end = (compiler.process(arg, **kw) for arg in element.clauses)
+    return f"(EXTRACT(EPOCH FROM ({end} - {start})) / 3600)"
+
+
+def sql_ceil(value):
+    """CEIL for non negative numbers, sqlite only has it when built with the math functions."""
+    whole = cast(value, Integer)
+    return whole + case((value > whole, 1), else_=0)
+
+
+def reservation_cost(cost_per_hr, start_time, end_time=None):
+    """Cost of a reservation, every started hour is billed. Ongoing ones are billed up to now."""
+    if end_time is None:
+        duration = (datetime.utcnow() - start_time).total_seconds() / 3600
+    else:
+        duration = (end_time - start_time).total_seconds() / 3600
+    return round(float(cost_per_hr) * ceil(duration), 2)
+
+
 class Reservation(db.Model):
     """
     Reservation table will maintain history while spot's won't,
@@ -151,13 +193,14 @@ class Reservation(db.Model):
     vehicle_number = db.Column(db.String(12), nullable=False)
     start_time = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     end_time = db.Column(db.DateTime)
+    final_cost = db.Column(db.Numeric(10, 2), nullable=True)                    # written at checkout
 
     # week relational attribute
     spot_number = db.Column(db.Integer, nullable=False, index=True)  # no sync
 
     # foreign keys
     # spot_id = db.Column(db.Integer, db.ForeignKey("parking_spot.id"), index=True, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), index=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)         # covered by the composite indexes
     lot_id = db.Column(db.Integer, db.ForeignKey("parking_lot.id"), index=True, nullable=False)
 
     user = db.relationship("User", back_populates="reservations")
@@ -168,17 +211,29 @@ class Reservation(db.Model):
         CheckConstraint("status IN ('O', 'C')", name="check_status"),
         CheckConstraint("cost_per_hr >= 0", name="check_cp_hr_non_negative"),
         CheckConstraint("LENGTH(vehicle_number) BETWEEN 6 AND 12", name="check_vehicle_number_len"),
+        db.Index("ix_reservation_user_status", "user_id", "status"),           # user_summary, deactivate_user
+        db.Index("ix_reservation_user_end_time", "user_id", "end_time"),       # user dashboard
         # CheckConstraint("end_time >= start_time", name="check_end_time_non_negative"),  fails if end_time not defined
+        # ids are never reused once archived rows leave this table
+        {"sqlite_autoincrement": True},
     )
 
     # methods
-    @property
+    @classmethod
+    def cost_until(cls, end_time):
+        """SQL version of reservation_cost(), billed up to `end_time` (a column or a datetime)."""
+        return func.round(cls.cost_per_hr * sql_ceil(hours_between(cls.start_time, end_time)), 2)
+
+    @hybrid_property
     def total_cost(self):
-        if self.end_time is None:
-            duration = (datetime.utcnow() - self.start_time).total_seconds() / 3600
-        else:
-            duration = (self.end_time - self.start_time).total_seconds() / 3600
-        return round(float(self.cost_per_hr) * ceil(duration), 2)
+        if self.final_cost is not None:
+            return float(self.final_cost)
+        return reservation_cost(self.cost_per_hr, self.start_time, self.end_time)
+
+    @total_cost.expression
+    def total_cost(cls):
+        # ongoing reservations are billed up to the moment the query is built
+        return func.coalesce(cls.final_cost, cls.cost_until(func.coalesce(cls.end_time, datetime.utcnow())))
 
     def __repr__(self):
         if self.end_time:
@@ -188,3 +243,56 @@ class Reservation(db.Model):
         } starting {self.start_time} STILL OCCUPIED >"
 
 
+class ReservationArchive(db.Model):
+    """
+    Cold copy of completed reservations older than RESERVATION_ARCHIVE_DAYS, moved here by services.archive
+    so the hot reservation table only holds recent history. Same columns and ids as Reservation,
+    final_cost is always filled in. History views read both tables through services.archive.history().
+    """
+    __tablename__ = "reservation_archive"
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+    status = db.Column(db.String(1), default="C", nullable=False)
+    cost_per_hr = db.Column(db.Numeric(10, 2), nullable=False)
+    vehicle_number = db.Column(db.String(12), nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False, index=True)            # export ranges
+    end_time = db.Column(db.DateTime, nullable=False)
+    final_cost = db.Column(db.Numeric(10, 2), nullable=False)
+    spot_number = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    lot_id = db.Column(db.Integer, db.ForeignKey("parking_lot.id"), index=True, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_reservation_archive_user_end_time", "user_id", "end_time"),
+    )
+
+    def __repr__(self):
+        return f"<ReservationArchive {self.id}: Spot {self.spot_number} by User {self.user_id} from {self.start_time} to {self.end_time}>"
+
+    __str__ = __repr__
+
+
+class SystemStats(db.Model):
+    """
+    Single row (id=1) holding the numbers shown on the admin summary page.
+    It is bumped incrementally by the write paths (see services.stats) and
+    `flask reconcile-stats` recomputes it from the real tables to fix any drift.
+    """
+    __tablename__ = "system_stats"
+    id = db.Column(db.Integer, primary_key=True)
+
+    total_users = db.Column(db.Integer, nullable=False, default=0)
+    active_users = db.Column(db.Integer, nullable=False, default=0)             # users with active_parking > 0
+    total_lots = db.Column(db.Integer, nullable=False, default=0)
+    active_lots = db.Column(db.Integer, nullable=False, default=0)
+    total_revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    total_reservations = db.Column(db.Integer, nullable=False, default=0)
+    total_spots = db.Column(db.Integer, nullable=False, default=0)              # sum of max_spots
+    occupied_spots = db.Column(db.Integer, nullable=False, default=0)
+    reconciled_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<SystemStats users={self.total_users} lots={self.total_lots} reservations={self.total_reservations}>"
+
+    __str__ = __repr__
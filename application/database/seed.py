@@ -0,0 +1,233 @@
+"""
+Bulk synthetic data for load testing, `flask seed --lots 10000 --spots 100 --users 100000 --reservations 10000000`.
+
+Every attribute is drawn as a NumPy array (names and addresses are picked from a small Faker sample), rows are
+inserted with chunked executemany statements and one commit per chunk. The password is hashed once and shared.
+Reservations are generated chunk by chunk while their effect on the counters is summed up with bincount, so
+memory stays flat; the counters (available_spots, total_parking, active_parking, total_revenue) are written
+with bulk UPDATEs at the end and the system stats are reconciled, the result is as consistent as real traffic:
+
+- ongoing reservations each hold a distinct occupied spot (spot.reservation_id set), the rest are completed
+  with end_time and final_cost filled in like a checkout would
+- the secondary indexes of parking_spot and reservation are dropped while loading and built once at the end
+"""
+import time
+from contextlib import contextmanager
+
+import click
+import numpy as np
+from faker import Faker
+from sqlalchemy import insert, update
+from werkzeug.security import generate_password_hash
+
+from .models import User, ParkingLot, ParkingSpot, Reservation
+from ..extensions import db
+
+CHUNK_SIZE = 50_000
+SAMPLE_SIZE = 500               # distinct faker names / streets / cities to combine
+PASSWORD = "password"
+
+STATES = np.array(["MH", "DL", "KA", "UP", "TN", "GJ", "RJ", "WB", "TS", "KL"])
+# share of arrivals per hour of the day (UTC), busy mornings and evenings
+HOURLY = np.array([1, 1, 1, 1, 1, 2, 4, 7, 9, 8, 6, 5, 5, 5, 5, 6, 7, 8, 8, 6, 4, 3, 2, 1], float)
+
+
+def _sample(fn, n):
+    return np.array([fn() for _ in range(n)], dtype=object)
+
+
+def _chunks(n, size):
+    for start in range(0, n, size):
+        yield start, min(size, n - start)
+
+
+def _insert(model, columns, chunk_size=CHUNK_SIZE, label=None):
+    """executemany of the column arrays in chunks, one transaction each."""
+    n = len(next(iter(columns.values())))
+    names = list(columns)
+    for start, k in _chunks(n, chunk_size):
+        rows = [dict(zip(names, values)) for values in zip(*(columns[c][start:start + k].tolist() for c in names))]
+        db.session.execute(insert(model.__table__), rows)      # core executemany, no ORM bookkeeping
+        db.session.commit()
+    if label:
+        click.echo(f"{n} {label}")
+
+
+def _update(model, columns, chunk_size=CHUNK_SIZE):
+    """Bulk UPDATE by primary key, `columns` must contain "id"."""
+    names = list(columns)
+    n = len(columns["id"])
+    for start, k in _chunks(n, chunk_size):
+        rows = [dict(zip(names, values)) for values in zip(*(columns[c][start:start + k].tolist() for c in names))]
+        db.session.execute(update(model), rows)
+        db.session.commit()
+
+
+@contextmanager
+def _without_indexes(*models):
+    """Drops the secondary indexes of the tables for the duration of a bulk load, then builds them once."""
+    indexes = [index for model in models for index in model.__table__.indexes]
+    connection = db.session.connection()
+    for index in indexes:
+        index.drop(connection)
+    db.session.commit()
+    yield
+    connection = db.session.connection()
+    for index in indexes:
+        index.create(connection)
+    db.session.commit()
+
+
+def _datetimes(seconds):
+    """Epoch seconds -> naive utc datetime objects, converted in C by NumPy."""
+    return np.asarray(seconds, dtype="datetime64[s]").astype(object)
+
+
+def _accounts():
+    """The admin and himanshu, same as create_admin, returns how many users exist."""
+    db.session.add_all([
+        User(username="admin", name="Admin User", gender="m", email="admin@mail.com", phone="9876543210",
+             password=generate_password_hash("admin@123"), role="admin"),
+        User(username="himanshu", name="Himanshu", gender="m", email="himanshu@mail.com", phone="9335354585",
+             password=generate_password_hash("test@123"), address="Lucknow", pincode="226017"),
+    ])
+    db.session.commit()
+    return 2
+
+
+def seed(lots=1000, spots=50, users=10_000, reservations=100_000, ongoing=0.05, days=365, rng_seed=None,
+         chunk_size=CHUNK_SIZE):
+    """
+    Drops every table and fills a fresh schema: `lots` lots with `spots` spots each, `users` users (plus admin
+    and himanshu), `reservations` reservations over the last `days` days of which the share `ongoing` is still
+    parked (at most one per spot). Every generated user logs in with PASSWORD.
+    """
+    rng = np.random.default_rng(rng_seed)
+    fake = Faker("en_IN")
+    fake.seed_instance(rng_seed)
+    began = time.perf_counter()
+
+    db.drop_all()
+    db.create_all()
+    password_hash = generate_password_hash(PASSWORD)            # the slow KDF runs once
+    first_user = _accounts() + 1
+
+    streets = _sample(fake.street_name, SAMPLE_SIZE)
+    cities = _sample(fake.city, SAMPLE_SIZE)
+    areas = _sample(fake.last_name, SAMPLE_SIZE)
+
+    # lots
+    lot_ids = np.arange(1, lots + 1)
+    rates = rng.integers(10, 61, lots).astype(float)
+    area = areas[rng.integers(0, SAMPLE_SIZE, lots)]
+    _insert(ParkingLot, dict(
+        id=lot_ids,
+        name=np.array([f"{a} Parking {i}" for a, i in zip(area, lot_ids)], dtype=object),
+        address=np.array([f"{n}, {s}, {c}" for n, s, c in zip(rng.integers(1, 999, lots), streets[rng.integers(0, SAMPLE_SIZE, lots)],
+                                                             cities[rng.integers(0, SAMPLE_SIZE, lots)])], dtype=object),
+        pincode=rng.integers(110001, 999999, lots).astype(str),
+        cost_per_hour=rates,
+        max_spots=np.full(lots, spots),
+        available_spots=np.full(lots, spots),
+    ), chunk_size, "lots")
+
+    # users
+    user_ids = np.arange(first_user, first_user + users)
+    first_names = _sample(fake.first_name, SAMPLE_SIZE)[rng.integers(0, SAMPLE_SIZE, users)]
+    last_names = _sample(fake.last_name, SAMPLE_SIZE)[rng.integers(0, SAMPLE_SIZE, users)]
+    usernames = np.array([f"{f.lower()}{i}" for f, i in zip(first_names, user_ids)], dtype=object)
+    _insert(User, dict(
+        id=user_ids,
+        username=usernames,
+        name=np.array([f"{f} {l}" for f, l in zip(first_names, last_names)], dtype=object),
+        email=np.array([f"{u}@example.com" for u in usernames], dtype=object),
+        phone=(6_000_000_000 + user_ids).astype(str),
+        password=np.full(users, password_hash, dtype=object),
+        gender=rng.choice(np.array(["m", "f", "o"]), users, p=[0.48, 0.48, 0.04]),
+        address=cities[rng.integers(0, SAMPLE_SIZE, users)],
+        pincode=rng.integers(110001, 999999, users).astype(str),
+    ), chunk_size, "users")
+
+    total_spots = lots * spots
+    user_total = np.zeros(users, np.int64)
+    user_active = np.zeros(users, np.int64)
+    lot_total = np.zeros(lots, np.int64)
+    lot_revenue = np.zeros(lots)
+    lot_occupied = np.zeros(lots, np.int64)
+    spot_total = np.zeros(total_spots, np.int64)
+
+    # a few users park a lot, most rarely: zipf like weights over a shuffled order
+    weights = 1 / np.arange(1, users + 1) ** 0.8
+    weights = rng.permutation(weights / weights.sum())
+    vehicles = np.array([f"{s}{d:02d}AB{n:04d}" for s, d, n in zip(
+        STATES[rng.integers(0, len(STATES), users)], rng.integers(1, 99, users), rng.integers(0, 9999, users))], dtype=object)
+
+    n_ongoing = min(int(reservations * ongoing), total_spots)
+    n_completed = reservations - n_ongoing
+    now = int(time.time())
+    hour_p = HOURLY / HOURLY.sum()
+
+    with _without_indexes(ParkingSpot, Reservation):
+        # spots, the ongoing reservations below take a random distinct sample of them
+        spot_numbers = np.tile(np.arange(1, spots + 1), lots)
+        spot_lots = np.repeat(lot_ids, spots)
+        _insert(ParkingSpot, dict(
+            id=np.arange(1, total_spots + 1), lot_id=spot_lots, spot_number=spot_numbers,
+            status=np.full(total_spots, "A"),
+        ), chunk_size, "spots")
+
+        # completed reservations, oldest first
+        next_id = 1
+        for _, k in _chunks(n_completed, chunk_size):
+            u = rng.choice(users, k, p=weights)
+            spot = rng.integers(0, total_spots, k)
+            lot = spot // spots
+            day = rng.integers(0, days, k)
+            start = (now - (day + 1) * 86400) // 86400 * 86400 + rng.choice(24, k, p=hour_p) * 3600 + rng.integers(0, 3600, k)
+            minutes = np.clip(rng.exponential(150, k).astype(np.int64), 5, 24 * 60)
+            end = np.minimum(start + minutes * 60, now - 60)
+            hours = np.maximum(np.ceil((end - start) / 3600), 1)
+            cost = np.round(rates[lot] * hours, 2)
+            order = np.argsort(start, kind="stable")
+            u, spot, lot, start, end, cost = u[order], spot[order], lot[order], start[order], end[order], cost[order]
+
+            _insert(Reservation, dict(
+                id=np.arange(next_id, next_id + k), user_id=user_ids[u], lot_id=lot_ids[lot],
+                spot_number=spot_numbers[spot], vehicle_number=vehicles[u], cost_per_hr=rates[lot],
+                status=np.full(k, "C"), start_time=_datetimes(start), end_time=_datetimes(end), final_cost=cost,
+            ), chunk_size)
+            next_id += k
+            np.add.at(user_total, u, 1)
+            lot_total += np.bincount(lot, minlength=lots)
+            lot_revenue += np.bincount(lot, weights=cost, minlength=lots)
+            spot_total += np.bincount(spot, minlength=total_spots)
+        click.echo(f"{n_completed} completed reservations")
+
+        # ongoing reservations, one per occupied spot, started within the last 12 hours
+        spot = rng.choice(total_spots, n_ongoing, replace=False)
+        lot = spot // spots
+        u = rng.choice(users, n_ongoing, p=weights)
+        ids = np.arange(next_id, next_id + n_ongoing)
+        _insert(Reservation, dict(
+            id=ids, user_id=user_ids[u], lot_id=lot_ids[lot], spot_number=spot_numbers[spot],
+            vehicle_number=vehicles[u], cost_per_hr=rates[lot], status=np.full(n_ongoing, "O"),
+            start_time=_datetimes(now - rng.integers(60, 12 * 3600, n_ongoing)),
+        ), chunk_size, "ongoing reservations")
+        np.add.at(user_total, u, 1)
+        np.add.at(user_active, u, 1)
+        lot_total += np.bincount(lot, minlength=lots)
+        lot_occupied += np.bincount(lot, minlength=lots)
+        spot_total += np.bincount(spot, minlength=total_spots)
+
+        # counters
+        _update(ParkingSpot, dict(id=spot + 1, status=np.full(n_ongoing, "O"), reservation_id=ids), chunk_size)
+        used = np.flatnonzero(spot_total)
+        _update(ParkingSpot, dict(id=used + 1, total_parking=spot_total[used]), chunk_size)
+    _update(ParkingLot, dict(id=lot_ids, total_parking=lot_total, available_spots=spots - lot_occupied,
+                             total_revenue=np.round(lot_revenue, 2)), chunk_size)
+    used = np.flatnonzero(user_total)
+    _update(User, dict(id=user_ids[used], total_parking=user_total[used], active_parking=user_active[used]), chunk_size)
+
+    from ..services import stats
+    stats.reconcile()
+    click.echo(f"seeded in {time.perf_counter() - began:.1f}s, every generated user logs in with '{PASSWORD}'")
@@ -1,23 +1,99 @@
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 # from flask_migrate import Migrate
 from flask_login import LoginManager
-from sqlalchemy import event
-from sqlalchemy.engine import Engine
+from functools import partial
+import bisect, threading, time
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
 
-db = SQLAlchemy()
+REPLICA_BIND = "replica"
+# upper bounds (seconds) of the checkout wait histogram kept by MeteredQueuePool
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class MeteredQueuePool(QueuePool):
+    """
+    QueuePool which also records how long each checkout waited for a connection (opening a new one and
+    pre-ping included), timeouts and the peak number of connections in use, read by services.pool_metrics.
+    The numbers start over when the engine is disposed.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_buckets = [0] * (len(POOL_WAIT_BUCKETS) + 1)     # last one is +Inf
+        self.peak_checked_out = 0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            with self._metrics_lock:
+                self.timeouts += 1
+            raise
+        waited = time.perf_counter() - start
+        with self._metrics_lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            self.wait_buckets[bisect.bisect_left(POOL_WAIT_BUCKETS, waited)] += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checkedout())
+        return connection
+
+
+class RoutingSession(Session):
+    """
+    Reads of a session marked read only (services.read_routing) go to the REPLICA_BIND engine of
+    SQLALCHEMY_BINDS when it is configured. Flushes and INSERT / UPDATE / DELETE always use the primary.
+    """
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get("read_only") and not self._flushing and not getattr(clause, "is_dml", False):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 # migrate = Migrate()
 login_manager = LoginManager()
 
-# Safe, context-free event hook for SQLite foreign key support
-@event.listens_for(Engine, "connect")
-def set_sqlite_pragma(dbapi_connection, connection_record):
+# pragmas which change the db file itself, a read-only connection must not run them
+SQLITE_WRITE_PRAGMAS = ("journal_mode",)
+
+# Connect hook applying the SQLITE_PRAGMAS profile from config (foreign keys, WAL, busy timeout, ...)
+def set_sqlite_pragma(pragmas, dbapi_connection, connection_record):
     # Enable only if using SQLite
     if dbapi_connection.__class__.__module__.startswith("sqlite3"):
         cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA foreign_keys=ON")
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
         # print("FK Enforcement is:", "ON" if cursor.fetchone()[0] else "OFF")
         cursor.close()
 
+
+def read_only_pragmas(pragmas):
+    """The pragmas a `mode=ro` connection can run: journal_mode writes the db file and fails there unless it is WAL already."""
+    return {name: value for name, value in pragmas.items() if name not in SQLITE_WRITE_PRAGMAS}
+
+
+def init_sqlite_pragmas(app):
+    """
+    Registers set_sqlite_pragma on the app's engines with app.config['SQLITE_PRAGMAS'], read-only ones
+    (the sqlite replica bind) get SQLITE_READ_ONLY_PRAGMAS, by default the profile without its write pragmas.
+    """
+    pragmas = app.config.get("SQLITE_PRAGMAS", {"foreign_keys": "ON"})
+    read_only = app.config.get("SQLITE_READ_ONLY_PRAGMAS") or read_only_pragmas(pragmas)
+    with app.app_context():
+        for engine in db.engines.values():
+            ro = engine.url.query.get("mode") == "ro"
+            event.listen(engine, "connect", partial(set_sqlite_pragma, read_only if ro else pragmas))
+
 # Optional: Flask-Login defaults
 login_manager.login_view = "auth.login"
 login_manager.login_message_category = "info"
@@ -0,0 +1,4 @@
+from .allocation import book_spot, checkout, SpotUnavailable, AlreadyCompleted
+from . import stats, user_cache
+
+__all__ = ['book_spot', 'checkout', 'SpotUnavailable', 'AlreadyCompleted', 'stats', 'user_cache']
@@ -0,0 +1,193 @@
+import time
+from datetime import datetime
+
+from sqlalchemy import select, update, func
+from sqlalchemy.exc import OperationalError
+
+from ..database.models import User, ParkingLot, ParkingSpot, Reservation
+from ..extensions import db
+from . import stats, user_cache, availability
+
+
+class SpotUnavailable(Exception):
+    """Raised when a lot is inactive or has no free spot left to claim."""
+
+
+class AlreadyCompleted(Exception):
+    """Raised when a reservation was already checked out (e.g. by a parallel request)."""
+
+
+# how many times a booking / checkout is retried when sqlite reports the db as locked
+MAX_RETRIES = 5
+RETRY_BACKOFF = 0.05        # seconds, grows linearly with each attempt
+
+
+def claim_spot_stmt(lot_id):
+    """
+    UPDATE which atomically flips one free spot of the lot to occupied, returning (id, spot_number).
+    The sub-select picks the lowest free spot number and the outer `status='A'` check
+    makes sure a spot which was grabbed by someone else in between is never claimed twice.
+    On Postgres (READ COMMITTED) the sub-select locks its pick and skips spots other bookings
+    have locked, so parallel bookers take different spots instead of racing for the same one
+    and failing while free spots remain. SQLite has a single writer and ignores the clause.
+    """
+    candidate = (
+        select(ParkingSpot.id)
+        .where(ParkingSpot.lot_id == lot_id, ParkingSpot.status == 'A')
+        .order_by(ParkingSpot.spot_number)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    return (
+        update(ParkingSpot)
+        .where(ParkingSpot.id == candidate, ParkingSpot.status == 'A')
+        .values(status='O', total_parking=ParkingSpot.total_parking + 1)
+        .returning(ParkingSpot.id, ParkingSpot.spot_number)
+    )
+
+
+def free_spot_stmt(reservation_id):
+    """UPDATE which frees the spot held by a reservation, through the spot's reservation_id."""
+    return update(ParkingSpot).where(ParkingSpot.reservation_id == reservation_id).values(status='A', reservation_id=None)
+
+
+def free_spot_by_number_stmt(lot_id, spot_number):
+    """Fallback of free_spot_stmt for spots booked before reservation_id existed, by the (lot_id, spot_number) index."""
+    return (update(ParkingSpot).where(ParkingSpot.lot_id == lot_id, ParkingSpot.spot_number == spot_number)
+            .values(status='A', reservation_id=None))
+
+
+def _claim_spot(lot_id):
+    return db.session.execute(claim_spot_stmt(lot_id), execution_options={"synchronize_session": False}).first()
+
+
+def _book_once(lot_id, user_id, vehicle_number):
+    # claim first, so the transaction starts with a write and never has to upgrade a read lock
+    claimed = _claim_spot(lot_id)
+    if claimed is None:
+        raise SpotUnavailable("No available spots in this lot.")
+    spot_id, spot_number = claimed
+
+    lot = db.session.get(ParkingLot, lot_id)
+    if lot is None or not lot.is_active:
+        raise SpotUnavailable("You can't book that's not available.")
+
+    reservation = Reservation(
+        user_id=user_id,
+        lot_id=lot_id,
+        vehicle_number=vehicle_number,
+        spot_number=spot_number,
+        cost_per_hr=lot.cost_per_hour,
+    )
+    db.session.add(reservation)
+    db.session.flush()          # reservation.id is needed by the spot
+
+    db.session.execute(
+        update(ParkingSpot).where(ParkingSpot.id == spot_id).values(reservation_id=reservation.id),
+        execution_options={"synchronize_session": False},
+    )
+    available = db.session.execute(
+        update(ParkingLot)
+        .where(ParkingLot.id == lot_id)
+        .values(available_spots=ParkingLot.available_spots - 1, total_parking=ParkingLot.total_parking + 1)
+        .returning(ParkingLot.available_spots)
+    ).scalar()
+    active_parking = db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(total_parking=User.total_parking + 1, active_parking=User.active_parking + 1)
+        .returning(User.active_parking)
+    ).scalar()
+    stats.bump(total_reservations=1, occupied_spots=1, active_users=1 if active_parking == 1 else 0)
+    user_cache.invalidate(user_id)          # bulk update, the mapper events don't see it
+    db.session.commit()
+    availability.publish(lot_id, available)
+    return reservation
+
+
+def _checkout_once(reservation):
+    # conditional close, a parallel checkout of the same reservation gets no row back.
+    # The cost is computed and stored by the same statement, completed reservations never recompute it
+    now = datetime.utcnow()
+    cost = db.session.execute(
+        update(Reservation)
+        .where(Reservation.id == reservation.id, Reservation.status == 'O')
+        .values(status='C', end_time=now, final_cost=Reservation.cost_until(now))
+        .returning(Reservation.final_cost)
+    ).scalar()
+    if cost is None:
+        raise AlreadyCompleted("This reservation has already been completed.")
+
+    # spot is resolved through its reservation_id, older rows fall back to the (lot_id, spot_number) unique index
+    freed = db.session.execute(free_spot_stmt(reservation.id), execution_options={"synchronize_session": False})
+    if freed.rowcount == 0:
+        db.session.execute(free_spot_by_number_stmt(reservation.lot_id, reservation.spot_number),
+                           execution_options={"synchronize_session": False})
+
+    available, is_active = db.session.execute(
+        update(ParkingLot)
+        .where(ParkingLot.id == reservation.lot_id)
+        .values(available_spots=ParkingLot.available_spots + 1,
+                total_revenue=func.coalesce(ParkingLot.total_revenue, 0) + cost)
+        .returning(ParkingLot.available_spots, ParkingLot.is_active),
+        execution_options={"synchronize_session": False},
+    ).one()
+    active_parking = db.session.execute(
+        update(User)
+        .where(User.id == reservation.user_id)
+        .values(active_parking=User.active_parking - 1)
+        .returning(User.active_parking)
+    ).scalar()
+    stats.bump(total_revenue=cost, occupied_spots=-1, active_users=-1 if active_parking == 0 else 0)
+    user_cache.invalidate(reservation.user_id)
+    db.session.commit()
+    availability.publish(reservation.lot_id, available, is_active)
+    return reservation
+
+
+def _with_retry(fn, *args):
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            return fn(*args)
+        except (SpotUnavailable, AlreadyCompleted):
+            db.session.rollback()
+            raise
+        except OperationalError as e:
+            db.session.rollback()
+            # sqlite signals writer contention as "database is locked", anything else is a real error
+            if "locked" not in str(e.orig) or attempt == MAX_RETRIES:
+                raise
+            time.sleep(RETRY_BACKOFF * attempt)
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+def book_spot(lot_id, user_id, vehicle_number):
+    """
+    Book the first free spot of a lot for the user in a single transaction.
+    Returns the new Reservation, raises SpotUnavailable if nothing can be booked.
+    """
+    return _with_retry(_book_once, lot_id, user_id, vehicle_number)
+
+
+def checkout(reservation):
+    """
+    Close an ongoing reservation, free its spot and book the revenue in a single transaction.
+    Counters are incremented inside the database, so parallel checkouts never overwrite each other.
+    Raises AlreadyCompleted if the reservation is no longer ongoing.
+    """
+    return _with_retry(_checkout_once, reservation)
+
+
+def backfill_final_costs():
+    """Store final_cost for completed reservations closed before it existed, in one UPDATE. Returns the row count."""
+    result = db.session.execute(
+        update(Reservation)
+        .where(Reservation.status == 'C', Reservation.final_cost.is_(None), Reservation.end_time.is_not(None))
+        .values(final_cost=Reservation.cost_until(Reservation.end_time)),
+        execution_options={"synchronize_session": False},
+    )
+    db.session.commit()
+    return result.rowcount
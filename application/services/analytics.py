@@ -0,0 +1,158 @@
+"""
+Revenue and occupancy time series for the admin summary, computed with NumPy.
+
+Reservations overlapping the window are read as plain columns in yield_per batches and turned into
+arrays once, every metric is then bucketed with bincount / cumsum instead of looping over rows:
+
+- revenue per bucket, the final cost booked in the bucket of the checkout
+- occupied spots per bucket (reservations overlapping it) and occupancy as a share of the lot's max_spots
+- average dwell time of the reservations completed in the window
+- peak hours, the hours of the day (UTC) with the most arrivals
+
+Results are cached per (window, lots, bucket aligned end) for ANALYTICS_CACHE_TTL seconds.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import select, func, or_, extract
+
+from ..database.models import ParkingLot
+from ..extensions import db
+from .archive import History
+from .user_cache import LRUCache
+
+BATCH_SIZE = 5000
+EPOCH = datetime(1970, 1, 1)        # naive utc, like every datetime column here
+PEAK_HOURS = 3
+
+# window name -> (length, bucket)
+WINDOWS = {
+    "24h": (timedelta(hours=24), timedelta(hours=1)),
+    "7d": (timedelta(days=7), timedelta(hours=6)),
+    "30d": (timedelta(days=30), timedelta(days=1)),
+    "90d": (timedelta(days=90), timedelta(days=1)),
+}
+
+
+def init_app(app):
+    app.extensions["analytics_cache"] = LRUCache(app.config.get("ANALYTICS_CACHE_SIZE", 64),
+                                                 app.config.get("ANALYTICS_CACHE_TTL", 60))
+
+
+def window_bounds(window, now=None):
+    """(start, end, bucket) of a window, the end rounded up to a whole bucket."""
+    length, bucket = WINDOWS[window]
+    step = int(bucket.total_seconds())
+    seconds = -(-int(((now or datetime.utcnow()) - EPOCH).total_seconds()) // step) * step
+    end = EPOCH + timedelta(seconds=seconds)
+    return end - length, end, bucket
+
+
+def _columns(start, end, lot_ids, now):
+    """
+    lot_id, start, end (now for ongoing ones) as epoch seconds, ongoing flag, rate and stored final cost
+    (NaN when missing) of the reservations overlapping [start, end). The database does the datetime conversion, so no datetime objects are built.
+    """
+    stmt = (
+        select(History.lot_id, extract("epoch", History.start_time),
+               func.coalesce(extract("epoch", History.end_time), int((now - EPOCH).total_seconds())),
+               History.end_time.is_(None), History.cost_per_hr, History.final_cost)
+        .where(History.start_time < end, or_(History.end_time.is_(None), History.end_time >= start))
+    )
+    if lot_ids:
+        stmt = stmt.where(History.lot_id.in_(lot_ids))
+
+    dtypes = (np.int64, np.int64, np.int64, bool, float, float)
+    columns = [[np.empty(0, dtype)] for dtype in dtypes]
+    with db.session.connection().execution_options(yield_per=BATCH_SIZE).execute(stmt) as result:
+        for batch in result.partitions():
+            for column, values, dtype in zip(columns, zip(*batch), dtypes):
+                column.append(np.array(values, dtype))
+    return [np.concatenate(column) for column in columns]
+
+
+def compute(window="24h", lot_ids=None, now=None):
+    now = now or datetime.utcnow()
+    start, end, bucket = window_bounds(window, now)
+    step = int(bucket.total_seconds())
+    n = int((end - start) / bucket)
+
+    lot_stmt = select(ParkingLot.id, ParkingLot.name, ParkingLot.max_spots).order_by(ParkingLot.id)
+    if lot_ids:
+        lot_stmt = lot_stmt.where(ParkingLot.id.in_(lot_ids))
+    lots = db.session.execute(lot_stmt).all()
+    ids = np.array([lot.id for lot in lots], np.int64)
+    capacity = np.array([lot.max_spots for lot in lots], float)
+    n_lots = len(lots)
+
+    lot_col, starts, ends, ongoing, rates, final = _columns(start, end, lot_ids, now)
+    known = np.isin(lot_col, ids)
+    li = np.searchsorted(ids, lot_col[known])           # row of the lot in every result array
+    starts, ends, ongoing, rates, final = starts[known], ends[known], ongoing[known], rates[known], final[known]
+
+    origin = int((start - EPOCH).total_seconds())
+    s = starts - origin             # seconds since the window start
+    e = ends - origin
+
+    # revenue, in the bucket of the checkout
+    done = ~ongoing & (e >= 0) & (e < n * step)
+    # the final cost stored at checkout, older rows are billed like reservation_cost
+    # (from whole seconds, a stay inside one second still started an hour)
+    billed = rates[done] * np.maximum(np.ceil((e[done] - s[done]) / 3600), 1)
+    cost = np.where(np.isnan(final[done]), billed, final[done])
+    revenue = np.bincount(li[done] * n + e[done] // step, weights=cost, minlength=n_lots * n).reshape(n_lots, n)
+
+    # occupied spots, +1 in the first bucket a reservation touches and -1 after the last one
+    first = np.clip(s // step, 0, n)
+    after = np.clip(-(-e // step), 0, n)
+    after = np.maximum(after, np.minimum(first + 1, n))       # zero length stays still counts in its bucket
+    width = n + 1
+    diff = (np.bincount(li * width + first, minlength=n_lots * width)
+            - np.bincount(li * width + after, minlength=n_lots * width)).reshape(n_lots, width)
+    occupied = np.cumsum(diff, axis=1)[:, :n]
+    occupancy = occupied / np.where(capacity > 0, capacity, 1)[:, None]
+
+    # dwell time of completed stays
+    dwell_sum = np.bincount(li[done], weights=(e[done] - s[done]) / 60, minlength=n_lots)
+    dwell_count = np.bincount(li[done], minlength=n_lots)
+    avg_dwell = np.divide(dwell_sum, dwell_count, out=np.zeros(n_lots), where=dwell_count > 0)
+
+    # arrivals by hour of the day
+    arrived = s >= 0
+    hours = starts[arrived] // 3600 % 24
+    arrivals = np.bincount(li[arrived] * 24 + hours, minlength=n_lots * 24).reshape(n_lots, 24)
+    peaks = np.argsort(-arrivals, axis=1, kind="stable")[:, :PEAK_HOURS]
+
+    labels = [(start + bucket * i).isoformat() for i in range(n)]
+    return dict(
+        window=window,
+        bucket_seconds=step,
+        start=start.isoformat(),
+        end=end.isoformat(),
+        labels=labels,
+        totals=dict(revenue=np.round(revenue.sum(axis=0), 2).tolist(), occupied=occupied.sum(axis=0).tolist(),
+                    occupancy=np.round(occupied.sum(axis=0) / max(capacity.sum(), 1), 4).tolist()),
+        lots=[dict(
+            id=lot.id,
+            name=lot.name,
+            max_spots=lot.max_spots,
+            revenue=np.round(revenue[i], 2).tolist(),
+            occupied=occupied[i].tolist(),
+            occupancy=np.round(occupancy[i], 4).tolist(),
+            avg_dwell_minutes=round(float(avg_dwell[i]), 1),
+            peak_hours=[int(h) for h in peaks[i] if arrivals[i, h] > 0],
+        ) for i, lot in enumerate(lots)],
+    )
+
+
+def get(window="24h", lot_ids=None):
+    """compute() through the per window cache."""
+    _, end, _ = window_bounds(window)
+    key = (window, tuple(sorted(lot_ids or ())), end)
+    cache = current_app.extensions["analytics_cache"]
+    result = cache.get(key)
+    if result is None:
+        result = compute(window, lot_ids)
+        cache.set(key, result)
+    return result
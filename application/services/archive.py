@@ -0,0 +1,81 @@
+"""
+Hot/cold split of the reservation history.
+
+Completed reservations older than RESERVATION_ARCHIVE_DAYS are moved from `reservation` to
+`reservation_archive` by archive_completed() (`flask archive-reservations`, meant for cron), so the
+hot table that booking, checkout and the dashboard hit stays small and its indexes stay in cache.
+
+History views read `History`, an alias of Reservation over `reservation UNION ALL reservation_archive`.
+It is used like the model itself (filters, order_by, joinedload(History.lot), History.total_cost) and
+loads plain Reservation objects, sqlite pushes the WHERE of the outer query down into both arms.
+Nothing is ever written through it.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select, insert, delete, union_all, func, literal
+from sqlalchemy.orm import aliased
+
+from ..database.models import Reservation, ReservationArchive
+from ..extensions import db
+
+COLUMNS = [column.name for column in Reservation.__table__.columns]
+
+
+def history_table():
+    """reservation UNION ALL reservation_archive, with the columns of the reservation table."""
+    archive = ReservationArchive.__table__.columns
+    return union_all(
+        select(*Reservation.__table__.columns),
+        select(*(archive[name] for name in COLUMNS)),
+    ).subquery("reservation_history")
+
+
+History = aliased(Reservation, history_table(), name="reservation_history")
+
+
+def get(reservation_id, **filters):
+    """A reservation by id from either table, None when missing."""
+    return db.session.scalars(select(History).filter_by(id=reservation_id, **filters)).first()
+
+
+def _archive_batch(ids, now):
+    # final_cost is filled in for the rows that predate it, archived rows are never recomputed
+    values = [func.coalesce(Reservation.final_cost, Reservation.cost_until(Reservation.end_time))
+              if name == "final_cost" else getattr(Reservation, name) for name in COLUMNS]
+    rows = select(*values, literal(now, ReservationArchive.archived_at.type)).where(Reservation.id.in_(ids))
+    db.session.execute(insert(ReservationArchive).from_select(COLUMNS + ["archived_at"], rows))
+    db.session.execute(delete(Reservation).where(Reservation.id.in_(ids)),
+                       execution_options={"synchronize_session": False})
+
+
+def archive_completed(days=None, batch_size=None, now=None):
+    """
+    Moves completed reservations which ended more than `days` ago (RESERVATION_ARCHIVE_DAYS by default)
+    into the archive, `batch_size` rows per transaction so writers are never blocked for long.
+    Commits every batch and returns the number of rows moved.
+    """
+    config = current_app.config
+    days = config["RESERVATION_ARCHIVE_DAYS"] if days is None else days
+    batch_size = batch_size or config["RESERVATION_ARCHIVE_BATCH"]
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=days)
+
+    stmt = (
+        select(Reservation.id)
+        .where(Reservation.status == 'C', Reservation.end_time < cutoff)
+        .order_by(Reservation.id)
+        .limit(batch_size)
+    )
+    moved = 0
+    while True:
+        ids = db.session.scalars(stmt).all()
+        if not ids:
+            return moved
+        try:
+            _archive_batch(ids, now)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        moved += len(ids)
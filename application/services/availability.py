@@ -0,0 +1,114 @@
+"""
+In-process pub/sub for lot availability, feeding the /user/availability/stream server-sent events.
+
+Write paths (book_spot, checkout, edit_lot, deactivate_lot) publish the lot's new count after their commit.
+Every stream subscribes a bounded queue, a client too slow to drain it is sent a fresh snapshot instead.
+The broker lives in one process: with several workers each stream only sees changes made by its own
+worker, clients get the full picture again from the snapshot sent on every (re)connect.
+A stream stays open for hours: snapshots run on a connection of their own which goes straight back to the
+pool, and the request's session is removed before the stream starts waiting, so streams hold no connection.
+"""
+import itertools, json, queue, threading
+
+from sqlalchemy import select
+
+from ..database.models import ParkingLot
+from ..extensions import db
+from . import lot_search
+
+QUEUE_SIZE = 256
+HEARTBEAT = 15          # seconds between keep-alive comments, so dead connections are noticed
+
+RESYNC = object()       # put on a queue which overflowed, tells the stream to send a new snapshot
+
+
+class Broker:
+    def __init__(self, queue_size=QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def subscribe(self):
+        q = queue.Queue(self.queue_size)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def publish(self, event):
+        with self._lock:
+            event = dict(event, id=next(self._ids))
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                _drain(q)
+                q.put_nowait(RESYNC)
+
+
+def _drain(q):
+    try:
+        while True:
+            q.get_nowait()
+    except queue.Empty:
+        pass
+
+
+broker = Broker()
+
+
+def publish(lot_id, available_spots, is_active=True):
+    """Announce the new availability of a lot, call it after the change is committed."""
+    lot_search.availability_changed(lot_id, available_spots, is_active)
+    broker.publish(dict(lot_id=lot_id, available_spots=available_spots, is_active=bool(is_active)))
+
+
+def snapshot(lot_ids=None):
+    """{lot_id: {available_spots, is_active}} for the given lots, or for every lot."""
+    stmt = select(ParkingLot.id, ParkingLot.available_spots, ParkingLot.is_active)
+    if lot_ids:
+        stmt = stmt.where(ParkingLot.id.in_(lot_ids))
+    with db.engine.connect() as connection:        # not the session, streams must not keep a connection checked out
+        return {lot_id: dict(available_spots=available, is_active=bool(active))
+                for lot_id, available, active in connection.execute(stmt)}
+
+
+def _sse(data, event=None, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def stream(lot_ids, resync):
+    """
+    Generator of server-sent events: a `snapshot` first, then one `availability` event per change.
+    `resync()` returns a new snapshot, it must be usable outside the request (e.g. from stream_with_context)
+    and give its connection back, see snapshot().
+    """
+    wanted = set(lot_ids or ())
+    q = broker.subscribe()
+    try:
+        first = resync()
+        db.session.remove()         # the request's connection goes back to the pool before the long wait
+        yield _sse(first, event="snapshot")
+        while True:
+            try:
+                event = q.get(timeout=HEARTBEAT)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            if event is RESYNC:
+                yield _sse(resync(), event="snapshot")
+            elif not wanted or event["lot_id"] in wanted:
+                yield _sse({k: v for k, v in event.items() if k != "id"}, event="availability", event_id=event["id"])
+    finally:
+        broker.unsubscribe(q)
@@ -0,0 +1,182 @@
+"""
+Background processing of uploaded avatars.
+
+edit_profile reads the upload and checks it with validate() while the user waits: a real JPEG / PNG / GIF /
+WEBP image within AVATAR_MAX_PIXELS, read from the header and verify() without decoding the pixels, so a
+rejected file gets its error message on the form. It then hands the bytes to submit() and the profile save
+returns at once. A small thread pool (AVATAR_WORKERS, its work queue is the local queue) then:
+
+- applies the EXIF rotation, crops to a square and writes one JPEG per size in AVATAR_SIZES,
+  re-encoded from the pixels only so EXIF, GPS and ICC metadata are dropped
+- names the files after the sha256 of the upload, so the same picture uploaded twice (by anyone) is
+  stored once and served with a long max-age, the name changes whenever the content does
+- points the user's avatar_url at the largest size and removes the previous files unless another
+  user still refers to them
+
+A newer upload of the same user wins over an older one still in the queue. Failures (e.g. a file which
+only breaks while decoding) are logged, the old avatar stays. AVATAR_WORKERS = 0 processes inline, for tests and scripts.
+"""
+import hashlib, io, os, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from ..database.models import User
+from ..extensions import db
+
+FORMATS = {"JPEG", "PNG", "GIF", "WEBP"}
+SUBDIR = "avatars"
+URL_PREFIX = f"/static/uploads/{SUBDIR}/"
+
+
+class InvalidAvatar(ValueError):
+    """The upload is not an image we accept."""
+
+
+class AvatarPipeline:
+    def __init__(self, app, workers=2):
+        self.app = app
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="avatar") if workers else None
+        self._latest = {}               # user_id -> digest of the newest upload
+        self._lock = threading.Lock()
+
+    def submit(self, user_id, data):
+        digest = content_digest(data, self.app.config["AVATAR_SIZES"])
+        with self._lock:
+            self._latest[user_id] = digest
+        if self.executor is None:
+            return self._run(user_id, data, digest)
+        return self.executor.submit(self._run, user_id, data, digest)
+
+    def _run(self, user_id, data, digest):
+        with self.app.app_context():
+            try:
+                folder = os.path.join(self.app.config["UPLOAD_FOLDER"], SUBDIR)
+                url = URL_PREFIX + store(data, digest, folder, self.app.config["AVATAR_SIZES"])
+                with self._lock:
+                    if self._latest.get(user_id) != digest:
+                        return None     # a newer upload is on its way
+                    self._latest.pop(user_id)
+                apply(user_id, url)
+                return url
+            except Exception:
+                db.session.rollback()
+                with self._lock:
+                    if self._latest.get(user_id) == digest:
+                        self._latest.pop(user_id)
+                self.app.logger.exception("avatar of user %s could not be processed", user_id)
+                return None
+            finally:
+                db.session.remove()
+
+
+def content_digest(data, sizes):
+    return hashlib.sha256(data + repr(tuple(sizes)).encode()).hexdigest()[:32]
+
+
+def filename(digest, size):
+    return f"{digest}_{size}.jpg"
+
+
+def check(data, max_pixels):
+    """Raises InvalidAvatar unless `data` is an accepted image format within `max_pixels`, pixels are not decoded."""
+    try:
+        with Image.open(io.BytesIO(data)) as probe:
+            image_format, (width, height) = probe.format, probe.size
+            probe.verify()                                  # truncated / corrupt files fail here
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise InvalidAvatar("it is not an image") from e
+    if image_format not in FORMATS:
+        raise InvalidAvatar(f"{image_format} images are not accepted")
+    if width * height > max_pixels:
+        raise InvalidAvatar(f"{width}x{height} is too large")
+
+
+def _write(image, path):
+    # temp file + rename, a reader never sees half an image
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            image.save(f, "JPEG", quality=85, optimize=True, progressive=True)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def store(data, digest, folder, sizes):
+    """Writes every size of the upload (unless already on disk) and returns the file name of the largest one."""
+    names = [filename(digest, size) for size in sizes]
+    os.makedirs(folder, exist_ok=True)
+    if all(os.path.exists(os.path.join(folder, name)) for name in names):
+        return names[0]             # duplicate upload
+
+    with Image.open(io.BytesIO(data)) as image:             # checked by validate() before it was submitted
+        image.seek(0)                                       # first frame of a GIF
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        image = image.convert("RGB")
+        for size, name in zip(sizes, names):
+            _write(ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS), os.path.join(folder, name))
+    return names[0]
+
+
+def _discard(url):
+    """Deletes the files of an old avatar nobody uses any more."""
+    if not url or "default_user" in url:
+        return
+    if db.session.query(User.id).filter(User.avatar_url == url).first() is not None:
+        return
+    upload_folder = current_app.config["UPLOAD_FOLDER"]
+    if url.startswith(URL_PREFIX):
+        digest = url[len(URL_PREFIX):].rsplit("_", 1)[0]
+        paths = [os.path.join(upload_folder, SUBDIR, filename(digest, size)) for size in current_app.config["AVATAR_SIZES"]]
+    else:
+        paths = [os.path.join(upload_folder, os.path.basename(url))]       # uploads from before the pipeline
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def apply(user_id, url):
+    user = db.session.get(User, user_id)
+    if user is None or user.avatar_url == url:
+        return
+    old, user.avatar_url = user.avatar_url, url
+    db.session.commit()
+    _discard(old)
+
+
+def init_app(app):
+    app.config.setdefault("AVATAR_WORKERS", 2)
+    app.config.setdefault("AVATAR_SIZES", (256, 64))
+    app.config.setdefault("AVATAR_MAX_BYTES", 5 * 1024 * 1024)
+    app.config.setdefault("AVATAR_MAX_PIXELS", 40_000_000)
+    app.extensions["avatars"] = AvatarPipeline(app, app.config["AVATAR_WORKERS"])
+
+    @app.template_filter("avatar")
+    def _avatar_size(url, size):
+        """The `size` thumbnail of a processed avatar url, other urls are returned as they are."""
+        if url and url.startswith(URL_PREFIX) and size in app.config["AVATAR_SIZES"]:
+            return URL_PREFIX + filename(url[len(URL_PREFIX):].rsplit("_", 1)[0], size)
+        return url
+
+
+def validate(data):
+    """Raises InvalidAvatar (with a message for the user) unless the upload can become an avatar."""
+    check(data, current_app.config["AVATAR_MAX_PIXELS"])
+
+
+def submit(user_id, data):
+    """
+    Queues an upload which passed validate() for processing, returns a Future (or the new url when
+    AVATAR_WORKERS is 0).
+    """
+    return current_app.extensions["avatars"].submit(user_id, data)
@@ -0,0 +1,127 @@
+"""
+Conditional GET for read-heavy pages and JSON endpoints, plus the Cache-Control policy of static files.
+
+@etag(stamp) wraps a view: stamp(*view_args) returns a cheap version of everything the response shows
+(a max(updated_at), a few counters), it is hashed with the full url and the viewer into a weak ETag.
+A request whose If-None-Match carries it gets an empty 304 and the view (queries, templates) never runs.
+Returning None from the stamp opts out, e.g. for pages with running costs that change by the minute.
+
+Every bulk UPDATE in the services sets updated_at through the column's onupdate, so booking and checkout
+move the stamps as well. Pages are `private, no-cache`: browsers keep them but revalidate every time.
+
+The lot pages render cached fragments (services.fragment_cache) keyed by lots_stamp() as well. It is read
+once per request, the ETag and the fragments of one response always belong to the same database version.
+"""
+import hashlib
+from functools import wraps
+
+from flask import current_app, g, request, session, make_response
+from flask_login import current_user
+from sqlalchemy import select, func
+
+from ..database.models import ParkingLot, SystemStats, User
+from ..extensions import db
+from .stats import STATS_ID
+
+
+def _viewer():
+    # the navbar shows the user's name and avatar, so the viewer is part of every page
+    if current_user.is_authenticated:
+        return current_user.id, current_user.updated_at
+    return None
+
+
+def make_etag(*parts):
+    raw = repr((current_app.config.get("ETAG_SALT"), request.full_path, _viewer()) + parts)
+    return hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()
+
+
+def etag(stamp):
+    """Decorator, put it below login_required / role_required so unauthorized requests never get a 304."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(*args, **kwargs)
+            version = stamp(*args, **kwargs)
+            if version is None:
+                return view(*args, **kwargs)
+
+            tag = make_etag(version)
+            # pending flash messages are only shown by a full render
+            if request.if_none_match.contains_weak(tag) and "_flashes" not in session:
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+            response.set_etag(tag, weak=True)
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+        return wrapped
+    return decorator
+
+
+# version stamps
+
+def lots_stamp(*args, **kwargs):
+    """
+    Changes with every lot insert or update, booking and checkout included (one aggregate over parking_lot).
+    Read once per request and shared by the ETag and the fragment cache.
+    """
+    if "_lots_stamp" not in g:
+        g._lots_stamp = tuple(db.session.execute(
+            select(func.count(ParkingLot.id), func.max(func.coalesce(ParkingLot.updated_at, ParkingLot.created_at)))
+        ).one())
+    return g._lots_stamp
+
+
+def lot_stamp(lot_id, *args, **kwargs):
+    """A single lot and its spots, spot changes always go together with a lot update."""
+    return db.session.scalar(
+        select(func.coalesce(ParkingLot.updated_at, ParkingLot.created_at)).where(ParkingLot.id == lot_id))
+
+
+def stats_stamp(*args, **kwargs):
+    """The admin summary counters, bumped by every write path."""
+    # kept on g for the request: the identity map only holds weak references, the view's stats.get_stats()
+    # finds the row there instead of selecting it again
+    row = g._system_stats = db.session.get(SystemStats, STATS_ID)
+    if row is None:
+        return None
+    return tuple(getattr(row, column.key) for column in SystemStats.__table__.columns)
+
+
+def reservations_stamp(*args, **kwargs):
+    """
+    The current user's reservation history, from the user's counters which move on every booking and checkout.
+    They are read from the row, not from current_user: the user cache of this worker may not have seen a booking
+    made through another one. None while a reservation is ongoing, its cost keeps growing.
+    """
+    if not current_user.is_authenticated:
+        return None
+    total, active = db.session.execute(
+        select(User.total_parking, User.active_parking).where(User.id == current_user.id)).one()
+    if active:
+        return None
+    return total, lots_stamp()
+
+
+def init_app(app):
+    app.config.setdefault("ETAG_SALT", "")
+    app.config.setdefault("STATIC_MAX_AGE", 3600)
+    app.config.setdefault("UPLOADS_MAX_AGE", 60)
+
+    @app.after_request
+    def _static_cache_control(response):
+        # app static and every blueprint's static, uploads from before services.avatars (which names files by
+        # content) were replaced under the same name so they expire sooner
+        if request.endpoint and (request.endpoint == "static" or request.endpoint.endswith(".static")):
+            filename = (request.view_args or {}).get("filename", "")
+            legacy_upload = filename.startswith("uploads/") and not filename.startswith("uploads/avatars/")
+            max_age = app.config["UPLOADS_MAX_AGE" if legacy_upload else "STATIC_MAX_AGE"]
+            if max_age:
+                response.cache_control.public = True
+                response.cache_control.max_age = max_age
+                response.cache_control.no_cache = None
+            else:
+                response.cache_control.no_cache = True
+        return response
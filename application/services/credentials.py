@@ -0,0 +1,166 @@
+"""
+The login path: one indexed lookup, tunable password hashing and deferred last_login writes.
+
+- find(id_type, value) loads the user by username, email or phone in one indexed query. Usernames and emails
+  match case insensitively through lower() expression indexes: profile edits store the email as typed.
+- hash_password / verify use PASSWORD_HASH_METHOD and PASSWORD_SALT_LENGTH (any werkzeug method, e.g.
+  scrypt:16384:8:1 or pbkdf2:sha256:600000). A successful login whose stored hash was made with other
+  parameters is rehashed with the current ones, so changing the config migrates active users as they log in.
+  Unknown ids are checked against a dummy hash, the response time does not tell which ids exist.
+- record_login(user_id) puts last_login into a per-worker buffer instead of committing it with the login. A
+  daemon thread writes the buffer every LAST_LOGIN_FLUSH_INTERVAL seconds, or as soon as LAST_LOGIN_BATCH logins
+  wait, with one executemany UPDATE: a login storm costs one write per batch instead of one commit per login.
+  The buffer of a killed worker is lost, it only holds last_login. LAST_LOGIN_FLUSH_INTERVAL = 0 writes inline.
+"""
+import atexit, threading
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import bindparam, case, func, or_, select, update
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from ..database.models import User
+from ..extensions import db
+
+LOOKUP = {"username": User.username, "email": User.email, "phone": User.phone}
+
+_users = User.__table__
+# never moves last_login backwards (another worker may flush an older login later) and keeps updated_at,
+# which the ETags of services.conditional are built from
+LAST_LOGIN_UPDATE = (
+    update(_users)
+    .where(_users.c.id == bindparam("b_id"))
+    .values(last_login=case((or_(_users.c.last_login.is_(None), _users.c.last_login < bindparam("b_at")), bindparam("b_at")),
+                            else_=_users.c.last_login),
+            updated_at=_users.c.updated_at)
+)
+
+
+class LastLoginBuffer:
+    def __init__(self, app, interval=30, batch=1000):
+        self.app = app
+        self.interval = interval
+        self.batch = batch
+        self._pending = {}              # user_id -> latest login
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, user_id, at):
+        with self._lock:
+            self._pending[user_id] = max(at, self._pending.get(user_id, at))
+            full = len(self._pending) >= self.batch
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="last-login", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+        if full:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered logins, returns how many. Failed batches go back into the buffer."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        with self.app.app_context():
+            try:
+                db.session.execute(LAST_LOGIN_UPDATE, [dict(b_id=user_id, b_at=at) for user_id, at in pending.items()])
+                db.session.commit()
+                return len(pending)
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception("writing last_login of %d users failed", len(pending))
+                with self._lock:
+                    for user_id, at in pending.items():
+                        self._pending[user_id] = max(at, self._pending.get(user_id, at))
+                return 0
+            finally:
+                db.session.remove()
+
+
+class Credentials:
+    def __init__(self, app):
+        self.method = app.config["PASSWORD_HASH_METHOD"]
+        self.salt_length = app.config["PASSWORD_SALT_LENGTH"]
+        self.last_login = LastLoginBuffer(app, app.config["LAST_LOGIN_FLUSH_INTERVAL"], app.config["LAST_LOGIN_BATCH"])
+        self._dummy = None
+
+    @property
+    def dummy(self):
+        # made on first use, its "method$" prefix is the normalized method (werkzeug fills in default costs)
+        if self._dummy is None:
+            self._dummy = self.hash("")
+        return self._dummy
+
+    @property
+    def prefix(self):
+        return self.dummy.split("$", 1)[0]
+
+    def hash(self, password):
+        return generate_password_hash(password, self.method, self.salt_length)
+
+
+def init_app(app):
+    app.config.setdefault("PASSWORD_HASH_METHOD", "scrypt")
+    app.config.setdefault("PASSWORD_SALT_LENGTH", 16)
+    app.config.setdefault("LAST_LOGIN_FLUSH_INTERVAL", 30)
+    app.config.setdefault("LAST_LOGIN_BATCH", 1000)
+    app.extensions["credentials"] = Credentials(app)
+
+
+def lookup_stmt(id_type, value):
+    """The login query for one id type, also checked by `flask index-audit`."""
+    column = LOOKUP[id_type]
+    if id_type == "phone":
+        return select(User).where(column == value).limit(1)
+    # an account spelled exactly like this wins over one which only differs in case
+    return select(User).where(func.lower(column) == value.lower()).order_by((column == value).desc()).limit(1)
+
+
+def find(id_type, value):
+    """The user with this username / email / phone or None."""
+    value = (value or "").strip()
+    if id_type not in LOOKUP or not value:
+        return None
+    return db.session.scalars(lookup_stmt(id_type, value)).first()
+
+
+def hash_password(password):
+    return current_app.extensions["credentials"].hash(password)
+
+
+def verify(user, password):
+    """
+    True when `password` is the user's. Rehashes it with the current parameters when they changed,
+    the new hash is part of the caller's transaction.
+    """
+    credentials = current_app.extensions["credentials"]
+    if user is None:
+        check_password_hash(credentials.dummy, password)        # same work as for a real user
+        return False
+    if not check_password_hash(user.password, password):
+        return False
+    if user.password.split("$", 1)[0] != credentials.prefix:
+        user.password = credentials.hash(password)
+    return True
+
+
+def record_login(user_id, at=None):
+    at = at or datetime.utcnow()
+    buffer = current_app.extensions["credentials"].last_login
+    if not buffer.interval:
+        db.session.execute(LAST_LOGIN_UPDATE, dict(b_id=user_id, b_at=at))        # committed by the caller
+        return
+    buffer.add(user_id, at)
+
+
+def flush_last_logins():
+    """Writes the buffered last_login values now, e.g. before a worker stops."""
+    return current_app.extensions["credentials"].last_login.flush()
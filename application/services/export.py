@@ -0,0 +1,77 @@
+"""
+Streaming export of the reservation history as CSV or NDJSON.
+
+Rows are plain column tuples (no ORM objects, so nothing piles up in the identity map) read through a
+server side cursor in batches of BATCH_SIZE, each batch is turned into one chunk of output. Memory use
+stays flat no matter how many rows match and the first bytes leave as soon as the first batch is read.
+"""
+import csv, io, json
+from datetime import datetime, date
+
+from sqlalchemy import select
+
+from ..database.models import User, ParkingLot
+from ..extensions import db
+from .archive import History
+
+BATCH_SIZE = 1000
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+COLUMNS = ["id", "user_id", "username", "user_name", "lot_id", "lot_name", "spot_number", "vehicle_number",
+           "status", "cost_per_hr", "start_time", "end_time", "total_cost"]
+
+
+def export_stmt(start=None, end=None, lot_ids=None):
+    """Reservations (archived ones too) with their user and lot names and total cost, started in [start, end), oldest first."""
+    stmt = (
+        select(History.id, History.user_id, User.username, User.name.label("user_name"),
+               History.lot_id, ParkingLot.name.label("lot_name"), History.spot_number,
+               History.vehicle_number, History.status, History.cost_per_hr,
+               History.start_time, History.end_time, History.total_cost)
+        .join(User, User.id == History.user_id)
+        .join(ParkingLot, ParkingLot.id == History.lot_id)
+        .order_by(History.id)
+    )
+    if start is not None:
+        stmt = stmt.where(History.start_time >= start)
+    if end is not None:
+        stmt = stmt.where(History.start_time < end)
+    if lot_ids:
+        stmt = stmt.where(History.lot_id.in_(lot_ids))
+    return stmt
+
+
+def _rows(stmt):
+    return db.session.execute(stmt.execution_options(yield_per=BATCH_SIZE)).partitions()
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return float(value)             # Decimal
+
+
+def stream_csv(stmt):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    yield buffer.getvalue()
+    for batch in _rows(stmt):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
+
+
+def stream_ndjson(stmt):
+    for batch in _rows(stmt):
+        yield "".join(json.dumps(dict(zip(COLUMNS, row)), default=_json_default) + "\n" for row in batch)
+
+
+def stream(fmt, stmt):
+    """Generator of text chunks for the given format, see FORMATS."""
+    return stream_csv(stmt) if fmt == "csv" else stream_ndjson(stmt)
@@ -0,0 +1,61 @@
+"""
+Cache of rendered HTML fragments for the lot listings (user.all_lots, admin.all_lots) and the lot cards of
+both dashboards, so a popular page is served without a single lot query.
+
+A fragment is keyed by its template, the view's arguments (sort, order, cursor, per page) and the lot data
+version read from the database, conditional.lots_stamp() (lot count and max updated_at, one aggregate). Every
+lot change moves it, booking and checkout included, whichever worker made the change, so no worker serves a
+fragment older than the data, and the ETags of the lot pages are built from the same stamp. Stale fragments
+are never read again and age out of the LRU. Fragments must not depend on the current user, the page
+around them does. Hit / miss / eviction counts are available from metrics().
+"""
+import threading
+
+from flask import current_app, render_template
+from markupsafe import Markup
+
+from . import conditional
+from .user_cache import LRUCache
+
+
+class FragmentCache:
+    def __init__(self, maxsize=256, ttl=30):
+        self.cache = LRUCache(maxsize, ttl)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def render(self, template, key, build, version):
+        # the version is read before building, a fragment built across a change is filed under the old one
+        cache_key = (template, key, version)
+        html = self.cache.get(cache_key)
+        with self._lock:
+            if html is not None:
+                self.hits += 1
+                return html
+            self.misses += 1
+        html = Markup(render_template(template, **build()))
+        self.cache.set(cache_key, html)
+        return html
+
+    def metrics(self):
+        lookups = self.hits + self.misses
+        return dict(hits=self.hits, misses=self.misses, hit_ratio=round(self.hits / lookups, 4) if lookups else 0.0,
+                    evictions=self.cache.evictions, size=len(self.cache))
+
+
+def init_app(app):
+    app.extensions["fragment_cache"] = FragmentCache(app.config.get("FRAGMENT_CACHE_SIZE", 256),
+                                                     app.config.get("FRAGMENT_CACHE_TTL", 30))
+
+
+def render(template, key, build):
+    """
+    The rendered `template` for `key` (a tuple of the view arguments), as Markup ready to be placed in a page.
+    On a miss build() is called for the template context, so every query the fragment needs belongs in it.
+    """
+    return current_app.extensions["fragment_cache"].render(template, key, build, conditional.lots_stamp())
+
+
+def metrics():
+    return current_app.extensions["fragment_cache"].metrics()
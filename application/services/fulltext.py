@@ -0,0 +1,109 @@
+"""
+Full-text search for the admin over users (username, name, email, phone, address) and parking lots
+(name, address, pincode) with SQLite FTS5.
+
+`user_fts` and `lot_fts` are external content FTS5 tables: they index the columns of `user` / `parking_lot`
+without storing a second copy. Triggers keep them in sync with every write, ORM or Core (bulk seed inserts,
+counter updates through update()), and the update triggers only fire when an indexed column changes, so the
+booking counters never touch the index. They are created with the tables by db.create_all(),
+`flask fts-rebuild` creates them on an existing database and rebuilds them from the content tables.
+
+Every word of the query is a prefix match, all words must match, results are ranked with bm25.
+Other databases fall back to case insensitive LIKE matching.
+"""
+import re
+
+from sqlalchemy import event, text, select, or_
+
+from ..database.models import User, ParkingLot
+from ..extensions import db
+
+DEFAULT_LIMIT = 50
+
+# fts table -> (content table, indexed columns, bm25 weight of each column)
+INDEXES = {
+    "user_fts": ("user", ("username", "name", "email", "phone", "address"), (10.0, 5.0, 5.0, 5.0, 1.0)),
+    "lot_fts": ("parking_lot", ("name", "address", "pincode"), (10.0, 1.0, 5.0)),
+}
+
+MODELS = {"user_fts": User, "lot_fts": ParkingLot}
+
+
+def _ddl(fts, table, columns):
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    return [
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content="{table}", content_rowid="id")',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON "{table}" BEGIN '
+        f'INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON "{table}" BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON "{table}" BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f'INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END',
+    ]
+
+
+def create(connection):
+    """Creates the FTS tables and their triggers if missing (sqlite only)."""
+    for fts, (table, columns, _) in INDEXES.items():
+        for statement in _ddl(fts, table, columns):
+            connection.execute(text(statement))
+
+
+def rebuild(connection):
+    """Creates what is missing and re-indexes every row of the content tables."""
+    create(connection)
+    for fts in INDEXES:
+        connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+
+@event.listens_for(db.metadata, "after_create")
+def _after_create(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        create(connection)
+
+
+@event.listens_for(db.metadata, "before_drop")
+def _before_drop(target, connection, **kw):
+    # the triggers go with their tables, the virtual tables are not part of the metadata
+    if connection.dialect.name == "sqlite":
+        for fts in INDEXES:
+            connection.execute(text(f"DROP TABLE IF EXISTS {fts}"))
+
+
+def match_query(q):
+    """FTS5 MATCH expression for free text: every word quoted (so no query syntax leaks through) and prefix matched."""
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", q or ""))
+
+
+def _search(fts, q, limit):
+    model = MODELS[fts]
+    _, columns, weights = INDEXES[fts]
+    if db.engine.dialect.name != "sqlite":
+        words = re.findall(r"\w+", q or "")
+        stmt = select(model).where(*(or_(*(getattr(model, c).ilike(f"%{w}%") for c in columns)) for w in words))
+        return db.session.scalars(stmt.order_by(model.id).limit(limit)).all() if words else []
+
+    expression = match_query(q)
+    if not expression:
+        return []
+    ranked = text(
+        f"SELECT rowid FROM {fts} WHERE {fts} MATCH :q ORDER BY bm25({fts}, {', '.join(map(str, weights))}) LIMIT :limit"
+    )
+    ids = db.session.scalars(ranked, dict(q=expression, limit=limit)).all()
+    if not ids:
+        return []
+    rows = {row.id: row for row in db.session.scalars(select(model).where(model.id.in_(ids)))}
+    return [rows[i] for i in ids if i in rows]
+
+
+def search_users(q, limit=DEFAULT_LIMIT):
+    """Users matching every word of `q`, best match first."""
+    return _search("user_fts", q, limit)
+
+
+def search_lots(q, limit=DEFAULT_LIMIT):
+    """Parking lots matching every word of `q`, best match first."""
+    return _search("lot_fts", q, limit)
@@ -0,0 +1,108 @@
+"""
+Registry of the app's hot queries and an EXPLAIN QUERY PLAN based audit over them.
+`flask index-audit` fails when any of these degrades to a full table scan, so an index
+regression is caught before deploy. Register new hot paths with @hot_query, built by the
+same function the route or service runs (never a copy of its query), so the audit follows
+every change of the real SQL.
+"""
+from ..extensions import db
+from .allocation import claim_spot_stmt, free_spot_stmt, free_spot_by_number_stmt
+from .archive import History
+from . import credentials, queries
+from .pagination import seek_query
+from .provisioning import spot_numbers_stmt, removable_spots_stmt
+
+HOT_QUERIES = {}
+
+
+def hot_query(name):
+    def register(fn):
+        HOT_QUERIES[name] = fn
+        return fn
+    return register
+
+
+@hot_query("book_lot: claim free spot")
+def _claim():
+    return claim_spot_stmt(1)
+
+
+@hot_query("edit_lot: removable free spots")
+def _shrink():
+    return removable_spots_stmt(1, 5)
+
+
+@hot_query("edit_lot: existing spot numbers")
+def _spot_numbers():
+    return spot_numbers_stmt(1)
+
+
+@hot_query("checkout: spot by reservation")
+def _spot_by_reservation():
+    return free_spot_stmt(1)
+
+
+@hot_query("checkout: spot by lot and number")
+def _spot_by_number():
+    return free_spot_by_number_stmt(1, 1)
+
+
+@hot_query("user.dashboard: latest reservations")
+def _dashboard():
+    return queries.latest_reservations_stmt(1)
+
+
+@hot_query("user_summary: active reservations")
+def _user_active():
+    return queries.active_count_stmt(1)
+
+
+@hot_query("deactivate_user: has active reservation")
+def _deactivate_user():
+    return queries.active_reservation_stmt(1)
+
+
+@hot_query("all_reservations: history of a user (hot + archive)")
+def _history():
+    return seek_query(queries.history_query(1), queries.RESERVATION_SORT_KEYS['end_time'], History.id).statement
+
+
+@hot_query("auth.login: user by username")
+def _login_username():
+    return credentials.lookup_stmt("username", "admin")
+
+
+@hot_query("auth.login: user by email")
+def _login_email():
+    return credentials.lookup_stmt("email", "admin@mail.com")
+
+
+@hot_query("auth.login: user by phone")
+def _login_phone():
+    return credentials.lookup_stmt("phone", "9876543210")
+
+
+def explain(stmt):
+    """Returns the EXPLAIN QUERY PLAN detail lines for a statement (sqlite only)."""
+    compiled = stmt.compile(dialect=db.engine.dialect)
+    params = compiled.construct_params()
+    positional = tuple(params[name] for name in compiled.positiontup) if compiled.positional else params
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", positional).fetchall()
+    return [row[-1] for row in rows]
+
+
+def full_scans(plan):
+    """Plan lines where sqlite walks a whole table (or a whole index) instead of searching it."""
+    tables = set(db.metadata.tables)
+    return [line for line in plan if line.startswith("SCAN ") and line.split()[1] in tables]
+
+
+def audit():
+    """Yields (name, plan lines, full scan lines) for every registered hot query."""
+    # EXPLAIN never checks the schema cookie, so pooled connections (and their statement cache)
+    # could report plans for indexes which no longer exist, start from fresh connections instead
+    db.engine.dispose()
+    for name, build in HOT_QUERIES.items():
+        plan = explain(build())
+        yield name, plan, full_scans(plan)
@@ -0,0 +1,156 @@
+"""
+In-memory search over parking lots: pincode prefix, name substring, price range and free spots.
+
+The searchable fields of every active lot are kept in a LotIndex: a pincode prefix trie (each node holds the
+ids of the lots below it) and the prices sorted once, so a range is two bisects. Name matching scans the
+lower-cased names of the remaining candidates in memory, nothing runs a LIKE '%...%' against the database.
+
+The index is rebuilt lazily, on the first search after a committed change to a ParkingLot row or after
+LOT_SEARCH_TTL seconds (changes made by other workers). Free spot counts move with every booking, those are
+patched in place from availability.publish() instead of rebuilding. search() only returns ids, callers load
+the lots by primary key and re-check the counts there.
+"""
+import time
+from bisect import bisect_left, bisect_right
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import object_session
+
+from ..database.models import ParkingLot
+from ..extensions import db
+
+PENDING_KEY = "lot_search_stale"
+
+
+class _Node:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children = {}
+        self.ids = set()
+
+
+class LotIndex:
+    """Immutable snapshot of the searchable fields, only the free spot counts are updated in place."""
+
+    def __init__(self, rows):
+        self.root = _Node()
+        self.names = {}
+        self.available = {}
+        prices = []
+        for lot_id, name, pincode, price, available in rows:
+            self.names[lot_id] = name.lower()
+            self.available[lot_id] = available
+            prices.append((float(price), lot_id))
+            node = self.root
+            node.ids.add(lot_id)
+            for digit in pincode:
+                node = node.children.setdefault(digit, _Node())
+                node.ids.add(lot_id)
+        prices.sort()
+        self.prices = [price for price, _ in prices]
+        self.price_ids = [lot_id for _, lot_id in prices]
+        self.built_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.names)
+
+    def with_pincode_prefix(self, prefix):
+        node = self.root
+        for digit in prefix:
+            node = node.children.get(digit)
+            if node is None:
+                return set()
+        return node.ids
+
+    def in_price_range(self, low=None, high=None):
+        start = 0 if low is None else bisect_left(self.prices, low)
+        end = len(self.prices) if high is None else bisect_right(self.prices, high)
+        return set(self.price_ids[start:end])
+
+    def search(self, pincode=None, name=None, min_price=None, max_price=None, min_available=None):
+        """Ids of the active lots matching every given filter, in no particular order."""
+        candidates = self.with_pincode_prefix(pincode) if pincode else self.root.ids
+        if min_price is not None or max_price is not None:
+            candidates = candidates & self.in_price_range(min_price, max_price)
+        if name:
+            needle = name.lower()
+            candidates = [lot_id for lot_id in candidates if needle in self.names[lot_id]]
+        if min_available:
+            candidates = [lot_id for lot_id in candidates if self.available[lot_id] >= min_available]
+        return list(candidates)
+
+
+class LotSearch:
+    """Per app holder of the current index."""
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.index = None
+
+    def invalidate(self):
+        self.index = None
+
+    def get(self):
+        index = self.index
+        if index is None or time.monotonic() - index.built_at > self.ttl:
+            rows = db.session.execute(
+                select(ParkingLot.id, ParkingLot.name, ParkingLot.pincode, ParkingLot.cost_per_hour,
+                       ParkingLot.available_spots)
+                .where(ParkingLot.is_active.is_(True))
+            ).all()
+            index = self.index = LotIndex(rows)
+        return index
+
+    def set_available(self, lot_id, available_spots, is_active=True):
+        index = self.index
+        if index is None:
+            return
+        if bool(is_active) != (lot_id in index.names):
+            self.index = None           # lot (de)activated, the next search rebuilds
+        else:
+            index.available[lot_id] = available_spots
+
+
+def init_app(app):
+    app.extensions["lot_search"] = LotSearch(app.config.get("LOT_SEARCH_TTL", 300))
+
+
+def _holder():
+    return current_app.extensions.get("lot_search") if has_app_context() else None
+
+
+def search(**filters):
+    """LotIndex.search() on the current index, see there for the filters."""
+    return _holder().get().search(**filters)
+
+
+def availability_changed(lot_id, available_spots, is_active=True):
+    """Called by availability.publish() after a committed change of a lot's free spots."""
+    holder = _holder()
+    if holder is not None:
+        holder.set_available(lot_id, available_spots, is_active)
+
+
+@event.listens_for(ParkingLot, "after_insert")
+@event.listens_for(ParkingLot, "after_update")
+@event.listens_for(ParkingLot, "after_delete")
+def _lot_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info[PENDING_KEY] = True
+
+
+# the index only drops after the change is committed, a rolled back edit keeps it
+@event.listens_for(db.session, "after_commit")
+def _rebuild_committed(session):
+    if session.info.pop(PENDING_KEY, False):
+        holder = _holder()
+        if holder is not None:
+            holder.invalidate()
+
+
+@event.listens_for(db.session, "after_rollback")
+def _forget_pending(session):
+    session.info.pop(PENDING_KEY, None)
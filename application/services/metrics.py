@@ -0,0 +1,93 @@
+"""
+Prometheus metrics at /metrics (text exposition format).
+
+- http_requests_total / http_request_duration_seconds per endpoint, method and status, recorded for every
+  blueprint by before_request / after_request, http_requests_in_progress
+- parking_bookings_total{result} from book_lot: success, no_spots (SpotUnavailable or a full / inactive lot), error
+- parking_checkouts_total{result} from free_reservation: success, already_completed, error
+- auth_logins_total{result} from auth.login: success, failure (wrong credentials or inactive), invalid (form)
+
+gunicorn workers each have their own memory, set PROMETHEUS_MULTIPROC_DIR to an empty directory before they
+start: prometheus_client then keeps every metric in mmap'ed files there and /metrics sums all workers. Clear
+the directory on each deploy and call prometheus_client.multiprocess.mark_process_dead(worker.pid) from the
+gunicorn child_exit hook. With METRICS_TOKEN set, scrapes need `Authorization: Bearer <token>`.
+"""
+import hmac, os, time
+
+from flask import g, request, current_app, abort, Response
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client import multiprocess
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUESTS = Counter("http_requests_total", "HTTP requests", ["endpoint", "method", "status"])
+LATENCY = Histogram("http_request_duration_seconds", "Time until the response is returned (streams: until the first byte)",
+                    ["endpoint", "method"], buckets=LATENCY_BUCKETS)
+IN_PROGRESS = Gauge("http_requests_in_progress", "Requests being handled", multiprocess_mode="livesum")
+BOOKINGS = Counter("parking_bookings_total", "Booking attempts", ["result"])
+CHECKOUTS = Counter("parking_checkouts_total", "Checkout attempts", ["result"])
+LOGINS = Counter("auth_logins_total", "Login attempts", ["result"])
+
+
+def booking(result):
+    BOOKINGS.labels(result).inc()
+
+
+def checkout(result):
+    CHECKOUTS.labels(result).inc()
+
+
+def login(result):
+    LOGINS.labels(result).inc()
+
+
+def _endpoint():
+    # the endpoint name keeps the label set small, unknown urls all count as one
+    return request.endpoint or "unmatched"
+
+
+def _start_request():
+    g._metrics_start = time.perf_counter()
+    g._metrics_in_progress = True
+    IN_PROGRESS.inc()
+
+
+def _finish_request(response):
+    start = g.pop("_metrics_start", None)
+    if start is not None:
+        endpoint = _endpoint()
+        LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - start)
+        REQUESTS.labels(endpoint, request.method, str(response.status_code)).inc()
+    return response
+
+
+def _request_done(exc):
+    # teardown also runs after an unhandled error, and after another before_request cut the request short
+    if g.pop("_metrics_in_progress", False):
+        IN_PROGRESS.dec()
+
+
+def _registry():
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def _metrics_view():
+    token = current_app.config.get("METRICS_TOKEN")
+    if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        abort(401)
+    return Response(generate_latest(_registry()), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_app(app):
+    app.config.setdefault("METRICS_ENABLED", True)
+    app.config.setdefault("METRICS_TOKEN", None)
+    if not app.config["METRICS_ENABLED"]:
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_request_done)
+    app.add_url_rule("/metrics", "metrics", _metrics_view)
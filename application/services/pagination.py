@@ -0,0 +1,133 @@
+import base64, json
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import and_, or_
+
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+
+class Page:
+    """One page of a keyset paginated listing with opaque cursors for the neighbouring pages."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None, per_page=DEFAULT_PER_PAGE):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.per_page = per_page
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _dump(value):
+    if isinstance(value, datetime):
+        return {"t": "dt", "v": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"t": "dec", "v": str(value)}
+    return {"t": "raw", "v": value}
+
+
+def _load(obj):
+    if obj["t"] == "dt":
+        return datetime.fromisoformat(obj["v"])
+    if obj["t"] == "dec":
+        return Decimal(obj["v"])
+    return obj["v"]
+
+
+def encode_cursor(value, row_id, direction):
+    raw = json.dumps({"k": _dump(value), "id": row_id, "d": direction}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Returns (value, id, direction) or None for a missing / tampered cursor (which just means first page)."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return _load(data["k"]), int(data["id"]), data["d"] if data["d"] in ("next", "prev") else "next"
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def clamp_per_page(per_page):
+    try:
+        per_page = int(per_page)
+    except (TypeError, ValueError):
+        return DEFAULT_PER_PAGE
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+
+def _direction(cursor):
+    boundary = decode_cursor(cursor)
+    return boundary, boundary[2] if boundary else "next"
+
+
+def seek_query(query, sort_key, id_column, order="asc", cursor=None, per_page=None):
+    """The query which loads one page of paginate() (one row more than per_page), also explained by index-audit."""
+    per_page = clamp_per_page(per_page)
+    ascending = order != "desc"
+    boundary, direction = _direction(cursor)
+
+    # walking backwards is the same seek with the ordering flipped, rows are reversed afterwards
+    forward = ascending if direction == "next" else not ascending
+
+    if boundary:
+        value, row_id, _ = boundary
+        if forward:
+            query = query.filter(or_(sort_key > value, and_(sort_key == value, id_column > row_id)))
+        else:
+            query = query.filter(or_(sort_key < value, and_(sort_key == value, id_column < row_id)))
+
+    if forward:
+        query = query.order_by(None).order_by(sort_key.asc(), id_column.asc())
+    else:
+        query = query.order_by(None).order_by(sort_key.desc(), id_column.desc())
+
+    # one extra row tells whether there is anything beyond this page
+    return query.add_columns(sort_key.label("_sort_key"), id_column.label("_sort_id")).limit(per_page + 1)
+
+
+def paginate(query, sort_key, id_column, order="asc", cursor=None, per_page=None):
+    """
+    Seek pagination over `query` ordered by (sort_key, id_column).
+    Instead of OFFSET the page starts right after (or before) the boundary row stored in the cursor,
+    so a deep page costs the same as the first one. sort_key must not be NULL, wrap nullable columns in coalesce.
+    """
+    per_page = clamp_per_page(per_page)
+    boundary, direction = _direction(cursor)
+    rows = seek_query(query, sort_key, id_column, order, cursor, per_page).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == "prev":
+        rows.reverse()
+
+    items = [row[0] for row in rows]
+    if not rows:
+        return Page(items, per_page=per_page)
+
+    first, last = rows[0], rows[-1]
+    more_after = has_more if direction == "next" else boundary is not None
+    more_before = boundary is not None if direction == "next" else has_more
+
+    return Page(
+        items,
+        next_cursor=encode_cursor(last[-2], last[-1], "next") if more_after else None,
+        prev_cursor=encode_cursor(first[-2], first[-1], "prev") if more_before else None,
+        per_page=per_page,
+    )
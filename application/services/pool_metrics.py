@@ -0,0 +1,33 @@
+"""
+Connection pool metrics of every engine (the primary and the replica bind), to size gunicorn workers and
+DB_POOL_SIZE / DB_MAX_OVERFLOW against real load. /admin/pool returns them as JSON.
+
+Occupancy comes from the pool itself, checkout wait times, timeouts and the peak from MeteredQueuePool
+(config.engine_options). Other pools (NullPool, StaticPool for in-memory sqlite) report their class only.
+The numbers belong to the worker process which answers.
+"""
+from sqlalchemy.pool import QueuePool
+
+from ..extensions import db, MeteredQueuePool, POOL_WAIT_BUCKETS
+
+
+def snapshot(pool):
+    row = dict(pool=type(pool).__name__)
+    if not isinstance(pool, QueuePool):
+        return row
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    row.update(size=pool.size(), max_overflow=pool._max_overflow, timeout=pool.timeout(),
+               checked_out=pool.checkedout(), checked_in=pool.checkedin(), overflow=max(pool.overflow(), 0),
+               utilization=round(pool.checkedout() / capacity, 4) if capacity else 0.0)
+    if isinstance(pool, MeteredQueuePool):
+        with pool._metrics_lock:
+            row.update(checkouts=pool.checkouts, timeouts=pool.timeouts, peak_checked_out=pool.peak_checked_out,
+                       wait_avg_ms=round(pool.wait_total / pool.checkouts * 1000, 3) if pool.checkouts else 0.0,
+                       wait_max_ms=round(pool.wait_max * 1000, 3), wait_total_s=round(pool.wait_total, 6),
+                       wait_buckets=dict(zip([*map(str, POOL_WAIT_BUCKETS), "+Inf"], pool.wait_buckets)))
+    return row
+
+
+def metrics():
+    """{bind: snapshot}, the default engine is "primary"."""
+    return {key or "primary": snapshot(engine.pool) for key, engine in db.engines.items()}
@@ -0,0 +1,70 @@
+from sqlalchemy import select, insert, delete
+
+from ..database.models import ParkingSpot
+from ..extensions import db
+
+
+class SpotsOccupied(Exception):
+    """Raised when a lot can't shrink because too many of its spots are occupied."""
+
+
+def spot_numbers_stmt(lot_id):
+    """Spot numbers of the lot in ascending order, a plain walk over the (lot_id, spot_number) unique index."""
+    return select(ParkingSpot.spot_number).where(ParkingSpot.lot_id == lot_id).order_by(ParkingSpot.spot_number)
+
+
+def removable_spots_stmt(lot_id, count):
+    """
+    DELETE of the `count` highest numbered free spots of the lot.
+    The outer `status='A'` check guarantees a spot booked in between is never removed,
+    which the per object before_delete event used to do.
+    """
+    candidates = (
+        select(ParkingSpot.id)
+        .where(ParkingSpot.lot_id == lot_id, ParkingSpot.status == 'A')
+        .order_by(ParkingSpot.spot_number.desc())
+        .limit(count)
+    )
+    return delete(ParkingSpot).where(ParkingSpot.id.in_(candidates), ParkingSpot.status == 'A')
+
+
+def free_spot_numbers(lot_id, count):
+    """The `count` lowest unused spot numbers of the lot (gaps first), found in one ordered scan."""
+    numbers = []
+    expected = 1
+    for number in db.session.scalars(spot_numbers_stmt(lot_id)):
+        if len(numbers) == count:
+            break
+        if number > expected:
+            numbers.extend(range(expected, min(number, expected + count - len(numbers))))
+        expected = max(expected, number + 1)
+    numbers.extend(range(expected, expected + count - len(numbers)))
+    return numbers
+
+
+def add_spots(lot_id, numbers):
+    """Insert free spots with the given numbers in one executemany. Does not commit."""
+    rows = [dict(lot_id=lot_id, spot_number=n, status="A", total_parking=0) for n in numbers]
+    if rows:
+        db.session.execute(insert(ParkingSpot), rows)
+    return len(rows)
+
+
+def grow_lot(lot_id, count):
+    """Add `count` free spots to the lot, filling gaps in the numbering first. Does not commit."""
+    return add_spots(lot_id, free_spot_numbers(lot_id, count))
+
+
+def shrink_lot(lot_id, count):
+    """
+    Remove `count` free spots from the lot with a single conditional DELETE. Does not commit.
+    Raises SpotsOccupied if fewer free spots were found, the caller has to roll back then.
+    """
+    if count <= 0:
+        return 0
+    removed = db.session.execute(
+        removable_spots_stmt(lot_id, count), execution_options={"synchronize_session": False}
+    ).rowcount
+    if removed < count:
+        raise SpotsOccupied("Cannot reduce max spots: Some of the extra spots are currently occupied.")
+    return removed
@@ -0,0 +1,45 @@
+"""
+Statements of the hot read paths in the views. The routes run them and `flask index-audit` explains the very
+same builders, so a change to a view's query is audited as it is shipped. Write path statements live with
+their service (allocation.claim_spot_stmt, provisioning.spot_numbers_stmt, credentials.lookup_stmt, ...).
+"""
+import datetime
+
+from sqlalchemy import select, func
+from sqlalchemy.orm import joinedload
+
+from ..database.models import ParkingLot, Reservation
+from ..extensions import db
+from .archive import History
+
+# built on History, the reservation history spans the hot and the archive table
+RESERVATION_SORT_KEYS = {
+    'lot_name': ParkingLot.name,
+    'start_time': History.start_time,
+    # ongoing reservations have no end_time, they sort as the oldest so they come first by default
+    'end_time': func.coalesce(History.end_time, datetime.datetime(1970, 1, 1)),
+}
+
+
+def latest_reservations_stmt(user_id, limit=4):
+    """user.dashboard: the user's first reservations by end_time, with their lots (the cards show the lot name)."""
+    return (select(Reservation).options(joinedload(Reservation.lot)).where(Reservation.user_id == user_id)
+            .order_by(Reservation.end_time).limit(limit))
+
+
+def active_count_stmt(user_id):
+    """user_summary: number of ongoing reservations of the user."""
+    return select(func.count()).select_from(Reservation).where(Reservation.user_id == user_id, Reservation.status == 'O')
+
+
+def active_reservation_stmt(user_id):
+    """deactivate_user: any ongoing reservation of the user."""
+    return select(Reservation.id).where(Reservation.user_id == user_id, Reservation.status == 'O').limit(1)
+
+
+def history_query(user_id, sort='end_time'):
+    """all_reservations: the user's reservation history (hot + archive), paginate it by RESERVATION_SORT_KEYS[sort]."""
+    query = db.session.query(History).filter_by(user_id=user_id)
+    if sort == 'lot_name':
+        query = query.join(History.lot)
+    return query.options(joinedload(History.lot))
@@ -0,0 +1,60 @@
+"""
+Read-only routing for the listing and reporting views.
+
+@read_only marks the request's session, its SELECTs then run on the "replica" bind of SQLALCHEMY_BINDS:
+a `mode=ro` connection to the same SQLite file in DevConfig (WAL readers never block the writer and can
+never take its write lock) or DATABASE_REPLICA_URL in ProdConfig. Long exports and summaries no longer
+hold connections of the primary while bookings and checkouts write. Without a replica bind nothing changes.
+
+Writes stay on the primary even inside a read-only view, extensions.RoutingSession sends every flush and
+INSERT / UPDATE / DELETE there. A replica may lag behind: a request that wrote marks the browser's session,
+its read-only views use the primary for the next READ_REPLICA_STICKY seconds (read your own writes). Lot
+fragments are keyed by the lots' version on the connection which reads them, a lagging replica only serves
+the fragments of its own version.
+"""
+import time
+from functools import wraps
+
+from flask import current_app, session
+from sqlalchemy import event
+
+from ..extensions import db
+
+READ_ONLY = "read_only"         # session.info flag read by RoutingSession.get_bind
+WROTE = "read_routing.wrote"
+STICKY_KEY = "_read_primary_until"
+
+
+def read_only(view):
+    """Decorator, put it right above conditional.etag so the version stamp is read from the replica as well."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if session.get(STICKY_KEY, 0) <= time.time():
+            db.session.info[READ_ONLY] = True
+        return view(*args, **kwargs)
+    return wrapped
+
+
+@event.listens_for(db.session, "before_flush")
+def _flushing(session_, flush_context, instances):
+    if session_.new or session_.dirty or session_.deleted:
+        session_.info[WROTE] = True
+
+
+@event.listens_for(db.session, "do_orm_execute")
+def _executing(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info[WROTE] = True
+
+
+def _stick_to_primary(response):
+    sticky = current_app.config["READ_REPLICA_STICKY"]
+    if sticky and db.session.info.pop(WROTE, False):
+        session[STICKY_KEY] = time.time() + sticky
+    return response
+
+
+def init_app(app):
+    app.config.setdefault("READ_REPLICA_STICKY", 5)
+    if app.config.get("SQLALCHEMY_BINDS", {}).get("replica"):
+        app.after_request(_stick_to_primary)
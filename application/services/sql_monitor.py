@@ -0,0 +1,139 @@
+"""
+Per-request SQL instrumentation: statement count, time spent in the db and repeated statements
+(the same SQL run again and again with other parameters is what an N+1 looks like).
+
+With SQL_INSTRUMENTATION on, every response carries X-SQL-Queries / X-SQL-Time-ms / X-SQL-Repeated headers,
+requests over SQL_QUERY_WARN statements or with a statement repeated SQL_REPEAT_WARN times are logged, and
+with SQL_DEBUG_ENDPOINT the last requests can be inspected at /debug/sql.
+query_budget() is the assertion helper for tests and benchmarks.
+"""
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request, jsonify, current_app
+from sqlalchemy import event
+
+from ..extensions import db
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised by query_budget() when a block runs more statements than allowed."""
+
+
+class RequestProfile:
+    def __init__(self):
+        self.statements = []            # (sql, seconds)
+
+    def record(self, statement, seconds):
+        self.statements.append((statement, seconds))
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    @property
+    def total_ms(self):
+        return sum(seconds for _, seconds in self.statements) * 1000
+
+    def repeated(self, threshold=2):
+        """{sql: times} for every statement which ran at least `threshold` times."""
+        counts = Counter(sql for sql, _ in self.statements)
+        return {sql: n for sql, n in counts.most_common() if n >= threshold}
+
+    def as_dict(self, repeat_threshold=2):
+        return dict(queries=self.count, time_ms=round(self.total_ms, 2), repeated=self.repeated(repeat_threshold))
+
+
+# open query_budget() blocks, they see every statement of the process
+_budgets = []
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("sql_monitor_start", []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["sql_monitor_start"].pop()
+    for profile in _budgets:
+        profile.record(statement, seconds)
+    if has_request_context() and "sql_profile" in g:
+        g.sql_profile.record(statement, seconds)
+
+
+def _start_request():
+    g.sql_profile = RequestProfile()
+
+
+def _finish_request(response):
+    profile = g.pop("sql_profile", None)
+    if profile is None:
+        return response
+    config = current_app.config
+    repeated = profile.repeated(config["SQL_REPEAT_WARN"])
+
+    response.headers["X-SQL-Queries"] = str(profile.count)
+    response.headers["X-SQL-Time-ms"] = f"{profile.total_ms:.2f}"
+    response.headers["X-SQL-Repeated"] = str(len(repeated))
+
+    if profile.count > config["SQL_QUERY_WARN"] or repeated:
+        current_app.logger.warning(
+            "%s %s ran %d statements in %.1fms%s", request.method, request.path, profile.count, profile.total_ms,
+            "".join(f"\n  {n}x {sql}" for sql, n in repeated.items()))
+
+    history = current_app.extensions.get("sql_monitor")
+    if history is not None:
+        history.append(dict(profile.as_dict(config["SQL_REPEAT_WARN"]), method=request.method, path=request.path,
+                            endpoint=request.endpoint, status=response.status_code))
+    return response
+
+
+def _debug_view():
+    return jsonify(requests=list(reversed(current_app.extensions["sql_monitor"])))
+
+
+def init_app(app):
+    app.config.setdefault("SQL_INSTRUMENTATION", False)
+    app.config.setdefault("SQL_QUERY_WARN", 20)
+    app.config.setdefault("SQL_REPEAT_WARN", 5)
+    app.config.setdefault("SQL_DEBUG_ENDPOINT", False)
+    if not app.config["SQL_INSTRUMENTATION"]:
+        return
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, "before_cursor_execute", _before_execute)
+            event.listen(engine, "after_cursor_execute", _after_execute)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+    if app.config["SQL_DEBUG_ENDPOINT"]:
+        app.extensions["sql_monitor"] = deque(maxlen=app.config.get("SQL_HISTORY", 50))
+        app.add_url_rule("/debug/sql", "sql_monitor", _debug_view)
+
+
+@contextmanager
+def query_budget(max_queries, allow_repeats=None):
+    """
+    Fails with QueryBudgetExceeded when the block runs more than `max_queries` statements, or when one
+    statement runs more than `allow_repeats` times. Needs SQL_INSTRUMENTATION (on in TestConfig) and counts
+    every statement of the process, so keep other threads quiet meanwhile. Works with or without a request, e.g.
+
+        with query_budget(5):
+            client.get("/user/all_reservations")
+    """
+    profile = RequestProfile()
+    _budgets.append(profile)
+    try:
+        yield profile
+    finally:
+        _budgets.remove(profile)
+
+    if profile.count > max_queries:
+        raise QueryBudgetExceeded(f"{profile.count} statements, budget is {max_queries}:\n"
+                                  + "\n".join(sql for sql, _ in profile.statements))
+    if allow_repeats is not None:
+        repeated = profile.repeated(allow_repeats + 1)
+        if repeated:
+            raise QueryBudgetExceeded("repeated statements (N+1?):\n"
+                                      + "\n".join(f"{n}x {sql}" for sql, n in repeated.items()))
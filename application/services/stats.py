@@ -0,0 +1,69 @@
+from datetime import datetime
+
+from sqlalchemy import update, func
+
+from ..database.models import User, ParkingLot, Reservation, ReservationArchive, SystemStats
+from ..extensions import db
+
+
+STATS_ID = 1
+
+
+def bump(**deltas):
+    """
+    Add the given deltas to the stats row, e.g. bump(total_lots=1, total_spots=20).
+    Runs inside the caller's transaction and does not commit, so the stats move together with the change.
+    If the row does not exist yet nothing happens, the next get_stats() builds it from scratch.
+    """
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+    values = {getattr(SystemStats, k): getattr(SystemStats, k) + v for k, v in deltas.items()}
+    db.session.execute(
+        update(SystemStats).where(SystemStats.id == STATS_ID).values(values),
+        execution_options={"synchronize_session": False},
+    )
+
+
+def compute():
+    """Full recount from the real tables, this is the slow path used only by reconcile()."""
+    return dict(
+        total_users=User.query.count(),
+        active_users=User.query.filter(User.active_parking > 0).count(),
+        total_lots=ParkingLot.query.count(),
+        active_lots=ParkingLot.query.filter_by(is_active=True).count(),
+        total_revenue=db.session.query(func.sum(ParkingLot.total_revenue)).scalar() or 0,
+        total_reservations=Reservation.query.count() + ReservationArchive.query.count(),
+        total_spots=db.session.query(func.sum(ParkingLot.max_spots)).scalar() or 0,
+        occupied_spots=db.session.query(func.sum(ParkingLot.max_spots - ParkingLot.available_spots)).scalar() or 0,
+    )
+
+
+def reconcile():
+    """
+    Recompute the stats row and commit it. Returns {column: (stored, actual)} for every column that had drifted.
+    """
+    actual = compute()
+    stats = db.session.get(SystemStats, STATS_ID)
+    if stats is None:
+        stats = SystemStats(id=STATS_ID)
+        db.session.add(stats)
+
+    drift = {}
+    for key, value in actual.items():
+        stored = getattr(stats, key)
+        if stored is not None and float(stored) != float(value):
+            drift[key] = (stored, value)
+        setattr(stats, key, value)
+    stats.reconciled_at = datetime.utcnow()
+    db.session.commit()
+    return drift
+
+
+def get_stats():
+    """O(1) read of the stats row, it is built on first use."""
+    stats = db.session.get(SystemStats, STATS_ID)
+    if stats is None:
+        reconcile()
+        stats = db.session.get(SystemStats, STATS_ID)
+    return stats
@@ -0,0 +1,145 @@
+"""
+Cache behind Flask-Login's load_user, so an authenticated page view does not have to query the user table.
+
+A cached user is a snapshot of the User columns keyed by id. On a hit it is attached to the request's
+session with merge(load=False), so it lands in the identity map and db.session.get(User, id) in the same
+request is free as well. Every ORM change to a User drops its entry, at flush and again after commit;
+bulk UPDATEs on the user table (allocation counters) have to call invalidate() themselves.
+
+The in-process LRU is per worker and invalidation only reaches the worker which made the change: other
+workers may serve a stale user for up to USER_CACHE_TTL seconds, so a deactivated user stays logged in there
+and active_parking lags behind bookings made elsewhere. Run more than one worker with USER_CACHE_URL set to a
+redis url, which shares one cache (and its invalidation) between workers, or lower USER_CACHE_TTL.
+current_user is fine for display, decisions (delete_account, the reservations ETag) read the row instead.
+"""
+import pickle, threading, time
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached, object_session
+
+from ..database.models import User
+from ..extensions import db
+
+PENDING_KEY = "user_cache_pending"
+
+
+class LRUCache:
+    """Thread safe in-process LRU with a per entry time to live."""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisCache:
+    """Same interface as LRUCache on top of redis, shared by every worker. Needs the `redis` package."""
+
+    def __init__(self, url, ttl=60, prefix="user:"):
+        import redis        # only needed when USER_CACHE_URL is set
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(f"{self.prefix}{key}")
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value):
+        self.client.setex(f"{self.prefix}{key}", self.ttl, pickle.dumps(value))
+
+    def delete(self, key):
+        self.client.delete(f"{self.prefix}{key}")
+
+    def clear(self):
+        for key in self.client.scan_iter(f"{self.prefix}*"):
+            self.client.delete(key)
+
+
+def init_app(app):
+    ttl = app.config.get("USER_CACHE_TTL", 60)
+    url = app.config.get("USER_CACHE_URL")
+    app.extensions["user_cache"] = RedisCache(url, ttl) if url else LRUCache(app.config.get("USER_CACHE_SIZE", 1024), ttl)
+
+
+def backend():
+    return current_app.extensions["user_cache"]
+
+
+def _snapshot(user):
+    return {attr.key: getattr(user, attr.key) for attr in User.__mapper__.column_attrs}
+
+
+def load(user_id):
+    """Returns the User with this id, from the cache when possible. None if there is no such user."""
+    data = backend().get(user_id)
+    if data is None:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            backend().set(user_id, _snapshot(user))
+        return user
+
+    user = User(**data)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def invalidate(user_id, session=None):
+    """Drop the cached user now and once more after the current transaction commits."""
+    backend().delete(user_id)
+    session = session or db.session()
+    session.info.setdefault(PENDING_KEY, set()).add(user_id)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    invalidate(target.id, object_session(target))
+
+
+# readers could have cached the old row between the flush and the commit, drop it again once committed
+@event.listens_for(db.session, "after_commit")
+def _drop_committed(session):
+    for user_id in session.info.pop(PENDING_KEY, ()):
+        backend().delete(user_id)
+
+
+@event.listens_for(db.session, "after_rollback")
+def _forget_pending(session):
+    session.info.pop(PENDING_KEY, None)
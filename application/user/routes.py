@@ -1,17 +1,19 @@
 from functools import wraps
 
-from flask import render_template, request, flash, redirect, url_for,  current_app
+from flask import render_template, request, flash, redirect, url_for,  current_app, jsonify, Response, stream_with_context
 from flask_login import current_user, login_required, logout_user
 
-import os, datetime
-from werkzeug.utils import secure_filename
-from sqlalchemy import asc, desc, func, case
+from sqlalchemy import func, case
 from sqlalchemy.orm import joinedload
 
 from . import user_bp
-from ..database.models import User, Reservation, ParkingLot, ParkingSpot
+from ..database.models import Reservation, ParkingLot
 from .user_forms import EditProfileForm
 from ..extensions import db
+from ..services import book_spot, checkout, SpotUnavailable, AlreadyCompleted
+from ..services.pagination import paginate
+from ..services import availability, lot_search, fragment_cache, conditional, avatars, read_routing, metrics, queries
+from ..services.archive import History
 
 
 def role_required(role):
@@ -41,10 +43,11 @@ def allowed_file(filename):
 @login_required
 def dashboard():
     user = current_user
-    lots = ParkingLot.query.filter(ParkingLot.available_spots > 0, ParkingLot.is_active==True).limit(4).all()
-    reservations = Reservation.query.filter(Reservation.user_id == user.id).order_by(Reservation.end_time).limit(4)
+    lot_cards = fragment_cache.render('user/_lot_cards.html', (), lambda: dict(
+        lots=ParkingLot.query.filter(ParkingLot.available_spots > 0, ParkingLot.is_active==True).limit(4).all()))
+    reservations = db.session.scalars(queries.latest_reservations_stmt(user.id)).all()
     if user:
-        return render_template('user/dashboard.html', lots=lots, reservations=reservations)
+        return render_template('user/dashboard.html', lot_cards=lot_cards, reservations=reservations)
     else:
         return 'Data Not Found.<br><a href="/">home</a>' # I think this file will never be display login will handle this.
 
@@ -52,8 +55,7 @@ def dashboard():
 @user_bp.route('/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
-    user = User.query.filter_by(username=current_user.username).first()
-    return render_template('user/user_profile_view.html', user=user)
+    return render_template('user/user_profile_view.html', user=current_user)
 
 
 @role_required('user')
@@ -71,32 +73,25 @@ def edit_profile():
         current_user.address = form.address.data
         current_user.pincode = form.pincode.data
 
-        # Handle optional avatar upload
+        # Optional avatar upload, resized and stored in the background (services.avatars)
         file = form.avatar.data  # Not using request.files directly
-
-        if file:
-            filename = secure_filename(file.filename)
-            upload_folder = current_app.config['UPLOAD_FOLDER']
-            new_path = os.path.join(upload_folder, filename)
-
-            # Create folder if it doesn't exist
-            os.makedirs(upload_folder, exist_ok=True)
-
-            # Delete old image if it's not the default one
-            old_path = os.path.join(upload_folder, os.path.basename(current_user.avatar_url or ""))
-            if os.path.exists(old_path) and "default_user.jpeg" not in old_path:
-                try:
-                    os.remove(old_path)
-                except Exception as e:
-                    print(f"Error deleting old file: {e}")
-
-            # Save new image
-            file.save(new_path)
-
-            current_user.avatar_url = f"/static/uploads/{filename}"
+        data = file.read(current_app.config['AVATAR_MAX_BYTES'] + 1) if file else b""
+        if len(data) > current_app.config['AVATAR_MAX_BYTES']:
+            flash("Profile picture is too large", "danger")
+            return render_template('user/edit_profile.html', form=form, user=current_user)
+        if data:
+            try:
+                avatars.validate(data)
+            except avatars.InvalidAvatar as e:
+                flash(f"Profile picture rejected, {e}", "danger")
+                return render_template('user/edit_profile.html', form=form, user=current_user)
 
         db.session.commit()
-        flash("Profile updated successfully", "success")
+        if data:
+            avatars.submit(current_user.id, data)
+            flash("Profile updated successfully, your new picture will show up in a moment", "success")
+        else:
+            flash("Profile updated successfully", "success")
         return redirect(url_for("user.profile"))
 
     return render_template('user/edit_profile.html', form=form, user=current_user)
@@ -105,16 +100,18 @@ def edit_profile():
 
 @user_bp.route("/summary")
 @login_required
+@read_routing.read_only
+@conditional.etag(conditional.reservations_stamp)
 def user_summary():
-    # Reservation count
-    total_reservations = Reservation.query.filter_by(user_id=current_user.id).count()
-    active_reservations = Reservation.query.filter_by(user_id=current_user.id, status='O').count()
+    # Reservation count, archived ones included
+    total_reservations = db.session.query(History).filter_by(user_id=current_user.id).count()
+    active_reservations = db.session.scalar(queries.active_count_stmt(current_user.id))
 
     # Status breakdown
     status_counts = (
-        db.session.query(Reservation.status, func.count())
-        .filter(Reservation.user_id == current_user.id)
-        .group_by(Reservation.status)
+        db.session.query(History.status, func.count())
+        .filter(History.user_id == current_user.id)
+        .group_by(History.status)
         .all()
     )
     status_data = {status: count for status, count in status_counts}
@@ -123,11 +120,11 @@ def user_summary():
     lot_stats_raw = (
         db.session.query(
             ParkingLot.name,
-            func.sum(case((Reservation.status == 'O', 1), else_=0)).label('active_count'),
-            func.sum(case((Reservation.status == 'C', 1), else_=0)).label('completed_count')
+            func.sum(case((History.status == 'O', 1), else_=0)).label('active_count'),
+            func.sum(case((History.status == 'C', 1), else_=0)).label('completed_count')
         )
-        .join(Reservation, Reservation.lot_id == ParkingLot.id)
-        .filter(Reservation.user_id == current_user.id)
+        .join(History, History.lot_id == ParkingLot.id)
+        .filter(History.user_id == current_user.id)
         .group_by(ParkingLot.name)
         .order_by(ParkingLot.name)
         .all()
@@ -158,7 +155,8 @@ def user_summary():
 def delete_account():
     if request.form.get("confirm_delete"):
         user = current_user
-        if user.active_parking == 0:
+        # checked in the db, current_user comes from the user cache and its counters may lag behind other workers
+        if db.session.scalar(queries.active_reservation_stmt(user.id)) is None:
         # Set inactive first
             user.is_active = False
             db.session.commit()  # Don't forget this
@@ -174,55 +172,110 @@ def delete_account():
     return redirect(url_for('user.profile'))
 
 
+# sort option -> keyset column, nullable columns are coalesced so the seek condition never sees NULL
+LOT_SORT_KEYS = {
+    'name': ParkingLot.name,
+    'pincode': ParkingLot.pincode,
+    'spots': ParkingLot.available_spots,
+    'price': ParkingLot.cost_per_hour,
+}
+
+
 @user_bp.route('/all_lots')
+@read_routing.read_only
+@conditional.etag(conditional.lots_stamp)
 def all_lots():
     sort = request.args.get('sort', 'name')
     order = request.args.get('order', 'asc')
 
-    lots = ParkingLot.query
+    if sort not in LOT_SORT_KEYS:
+        sort = 'name'
+    cursor, per_page = request.args.get('cursor'), request.args.get('per_page')
+
+    def build():
+        page = paginate(ParkingLot.query, LOT_SORT_KEYS[sort], ParkingLot.id, order, cursor=cursor, per_page=per_page)
+        return dict(lots=page.items, page=page, sort=sort, order=order)
+
+    lot_list = fragment_cache.render("user/_lot_list.html", (sort, order, cursor, per_page), build)
+    return render_template("user/show_all_lots.html", lot_list=lot_list)
+
+
+@user_bp.route('/search')
+def search():
+    """
+    Lots by pincode prefix, name substring, price range and free spots, filtered by the in-memory
+    lot_search index. The navbar box sends ?q=, digits are a pincode prefix and anything else a name.
+    """
+    q = request.args.get('q', '').strip()
+    filters = dict(
+        pincode=request.args.get('pincode', '').strip() or (q if q.isdigit() else ''),
+        name=request.args.get('name', '').strip() or ('' if q.isdigit() else q),
+        min_price=request.args.get('min_price', type=float),
+        max_price=request.args.get('max_price', type=float),
+        min_spots=request.args.get('min_spots', type=int),
+    )
+    sort = request.args.get('sort', 'name')
+    order = request.args.get('order', 'asc')
+    if sort not in LOT_SORT_KEYS:
+        sort = 'name'
+
+    ids = lot_search.search(pincode=filters['pincode'], name=filters['name'], min_price=filters['min_price'],
+                            max_price=filters['max_price'], min_available=filters['min_spots'])
+    # primary key lookups only, the free spots are checked again against the committed counts
+    lots_query = ParkingLot.query.filter(ParkingLot.id.in_(ids))
+    if filters['min_spots']:
+        lots_query = lots_query.filter(ParkingLot.available_spots >= filters['min_spots'])
+
+    page = paginate(
+        lots_query, LOT_SORT_KEYS[sort], ParkingLot.id, order,
+        cursor=request.args.get('cursor'), per_page=request.args.get('per_page'),
+    )
+
+    args = {key: value for key, value in filters.items() if value not in (None, '')}
+    return render_template("user/user_search_results.html", lots=page.items, page=page, sort=sort, order=order,
+                           filters=filters, args=args)
 
-    if sort == 'name':
-        lots = lots.order_by(ParkingLot.name.asc() if order == 'asc' else ParkingLot.name.desc())
-    elif sort == 'pincode':
-        lots = lots.order_by(ParkingLot.pincode.asc() if order == 'asc' else ParkingLot.pincode.desc())
-    elif sort == 'spots':
-        lots = lots.order_by(ParkingLot.available_spots.asc() if order == 'asc' else ParkingLot.available_spots.desc())
-    elif sort == 'price':
-        lots = lots.order_by(ParkingLot.cost_per_hour.asc() if order == 'asc' else ParkingLot.cost_per_hour.desc())
 
-    return render_template("user/show_all_lots.html", lots=lots.all(), sort=sort, order=order)
+# ?lot=1&lot=2 limits both availability endpoints to those lots, without it every lot is included
+@user_bp.route('/availability')
+@conditional.etag(conditional.lots_stamp)
+def lot_availability():
+    return jsonify(lots=availability.snapshot(request.args.getlist('lot', type=int)))
+
+
+@user_bp.route('/availability/stream')
+def lot_availability_stream():
+    lot_ids = request.args.getlist('lot', type=int)
+    events = availability.stream(lot_ids, lambda: availability.snapshot(lot_ids))
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @user_bp.route('/all_reservations')
 @login_required
+@read_routing.read_only
+@conditional.etag(conditional.reservations_stamp)
 def all_reservations():
-    sort = request.args.get('sort', 'name')
+    sort = request.args.get('sort', 'end_time')
     order = request.args.get('order', 'asc')
 
-    reservations_query = Reservation.query.filter_by(user_id=current_user.id)
-
-    if sort == 'lot_name':
-        reservations_query = reservations_query.join(ParkingLot).order_by(
-            asc(ParkingLot.name) if order == 'asc' else desc(ParkingLot.name)
-        )
-    elif sort == 'start_time ':
-        reservations_query = reservations_query.order_by(
-            asc(Reservation.start_time ) if order == 'asc' else desc(Reservation.start_time )
-        )
-    elif sort == 'end_time ' or 1==1:       # it is else block as well
-        reservations_query = reservations_query.order_by(asc(Reservation.end_time) if order == 'asc' else desc(Reservation.end_time))
+    if sort not in queries.RESERVATION_SORT_KEYS:
+        sort = 'end_time'       # it was the fallback for every unknown sort as well
 
-    reservations = reservations_query.options(joinedload(Reservation.lot)).all()
+    page = paginate(
+        queries.history_query(current_user.id, sort), queries.RESERVATION_SORT_KEYS[sort], History.id, order,
+        cursor=request.args.get('cursor'), per_page=request.args.get('per_page'),
+    )
 
     return render_template(
-        'user/show_all_reservations.html', reservations=reservations, sort=sort, order=order)
+        'user/show_all_reservations.html', reservations=page.items, page=page, sort=sort, order=order)
 
 
 @user_bp.route('/details_reservation/<int:reservation_id>')
 @login_required
 def details_reservation(reservation_id):
 
-    reservation = Reservation.query.filter_by(
+    reservation = db.session.query(History).filter_by(
         id=reservation_id,
         user_id=current_user.id
     ).first_or_404()
@@ -234,44 +287,27 @@ def details_reservation(reservation_id):
 @login_required
 def book_lot(lot_id):
     lot = ParkingLot.query.get_or_404(lot_id)
-    if lot.available_spots <= 0 and not lot.is_active:
+    if lot.available_spots <= 0 or not lot.is_active:
+        if request.method == 'POST':
+            metrics.booking("no_spots")
         flash("You can't book that's not available.", "warning")
         return redirect(url_for('user.all_lots'))
     if request.method == 'GET':
         return render_template('user/book_parking.html', lot=lot)
     else:
         vehicle_number = request.form.get('vehicle_number')
-        spot = db.session.query(ParkingSpot).filter_by(lot_id=lot_id, status='A').with_for_update(skip_locked=True).first()
-
-        if not spot:
-            flash("No available spots in this lot.", "danger")
-            return redirect(url_for('user.all_lots'))
-
-        reservation = Reservation(
-            user_id=current_user.id,
-            lot_id=lot_id,
-            vehicle_number=vehicle_number,
-            spot_number=spot.spot_number,
-            cost_per_hr=lot.cost_per_hour,
-        )
-        db.session.add(reservation)
-        db.session.commit()
-
-        spot.status = 'O'
-        spot.reservation_id = reservation.id
-        spot.total_parking += 1
-        lot.available_spots -= 1
-        lot.total_parking += 1
-        current_user.total_parking += 1
-        current_user.active_parking += 1
 
         try:
-            db.session.add(reservation)
-            db.session.commit()
+            book_spot(lot_id, current_user.id, vehicle_number)
+            metrics.booking("success")
             flash("Reservation successful!", "success")
             return redirect(url_for('user.dashboard'))
+        except SpotUnavailable as e:
+            metrics.booking("no_spots")
+            flash(str(e), "danger")
+            return redirect(url_for('user.all_lots'))
         except Exception as e:
-            db.session.rollback()
+            metrics.booking("error")
             flash("Something went wrong while reserving. Please try again.", "danger")
             return redirect(url_for('user.dashboard'))
 
@@ -281,42 +317,36 @@ def book_lot(lot_id):
 @login_required
 def free_reservation(reservation_id):
 
-    # Find the specific reservation for the current user, or return 404
-    reservation = Reservation.query.filter_by(id=reservation_id, user_id=current_user.id).first_or_404()
+    # Find the specific reservation for the current user (with its lot and user in the same query), or return 404
+    reservation = (
+        Reservation.query
+        .options(joinedload(Reservation.lot), joinedload(Reservation.user))
+        .filter_by(id=reservation_id, user_id=current_user.id)
+        .first_or_404()
+    )
 
     # Prevent re-freeing an already completed reservation
     if reservation.status == 'C' or reservation.end_time is not None:
-
+        if request.method == 'POST':
+            metrics.checkout("already_completed")
         flash('This reservation has already been completed.', 'warning')
         return redirect(url_for('user.details_reservation', reservation_id=reservation.id))
 
     if request.method == 'POST':
         try:
-
-            # 1. update reservation
-            reservation.status = 'C'                # completed
-            reservation.end_time = datetime.datetime.utcnow()
-
-            # 2. update spot & lot
-            spot = db.session.query(ParkingSpot).filter_by(spot_number=reservation.spot_number, lot_id=reservation.lot_id).first()
-            spot.status = 'A'
-            # print(spot)
-            spot.reservation_id = None
-            reservation.lot.total_revenue = float(reservation.lot.total_revenue) + reservation.total_cost
-            reservation.lot.available_spots += 1
-
-            # 3. update user
-            reservation.user.active_parking -= 1        # he/she freed one parking
-
-            # 4. commit
-            db.session.commit()
+            checkout(reservation)
+            metrics.checkout("success")
 
             flash(f'Checkout successful for Spot #{reservation.spot_number}! Thank you.', 'success')
             return redirect(url_for('user.dashboard'))
 
+        except AlreadyCompleted as e:
+            metrics.checkout("already_completed")
+            flash(str(e), 'warning')
+            return redirect(url_for('user.details_reservation', reservation_id=reservation_id))
+
         except Exception as e:
-            print("in except block")
-            db.session.rollback()
+            metrics.checkout("error")
             print(e)
             flash(f'An error occurred during checkout: {e.with_traceback(None)}', 'danger')
             return redirect(url_for('user.all_reservations'))
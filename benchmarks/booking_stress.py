@@ -0,0 +1,107 @@
+"""
+Concurrency stress test for the spot allocation service.
+
+Fires a lot of parallel bookings at one lot and checks that no spot was handed out twice
+and that the lot / spot / user counters still agree with the reservation table.
+
+run from the project root:
+    python -m benchmarks.booking_stress --spots 200 --bookings 300 --workers 32
+"""
+import argparse, os, sys, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func
+
+from application import create_app
+from application.config import TestConfig
+from application.extensions import db
+from application.database.models import User, ParkingLot, ParkingSpot, Reservation
+from application.services import book_spot, SpotUnavailable
+
+
+def make_config(tmp_dir):
+    class BenchConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tmp_dir, 'bench.sqlite3')}"
+        UPLOAD_FOLDER = os.path.join(tmp_dir, "uploads")
+        WTF_CSRF_ENABLED = False
+    return BenchConfig
+
+
+def seed(app, spots, users):
+    with app.app_context():
+        db.create_all()
+        lot = ParkingLot(name="Stress Lot", address="Benchmark Road", pincode="110001",
+                         cost_per_hour=20, max_spots=spots, available_spots=spots)
+        db.session.add(lot)
+        db.session.flush()
+        db.session.add_all(ParkingSpot(lot_id=lot.id, spot_number=i, status="A", total_parking=0)
+                           for i in range(1, spots + 1))
+        db.session.add_all(User(username=f"stress{i}", name=f"Stress {i}", email=f"stress{i}@example.com",
+                                phone=f"9{i:09d}", password="x", gender="o")
+                           for i in range(users))
+        db.session.commit()
+        return lot.id, [u.id for u in User.query.all()]
+
+
+def run(app, lot_id, user_ids, bookings, workers):
+    def attempt(i):
+        with app.app_context():
+            try:
+                return book_spot(lot_id, user_ids[i % len(user_ids)], f"BN{i:06d}").spot_number
+            except SpotUnavailable:
+                return None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(attempt, range(bookings)))
+    return results, time.perf_counter() - start
+
+
+def check(app, lot_id, spots, results):
+    booked = [r for r in results if r is not None]
+    errors = []
+
+    if len(booked) != len(set(booked)):
+        errors.append(f"double allocation: {len(booked) - len(set(booked))} spots handed out twice")
+    if len(booked) != min(spots, len(results)):
+        errors.append(f"expected {min(spots, len(results))} bookings, got {len(booked)}")
+
+    with app.app_context():
+        lot = db.session.get(ParkingLot, lot_id)
+        occupied = ParkingSpot.query.filter_by(lot_id=lot_id, status="O").count()
+        reservations = Reservation.query.filter_by(lot_id=lot_id, status="O").count()
+        distinct = db.session.query(func.count(func.distinct(Reservation.spot_number))).scalar()
+        user_active = db.session.query(func.sum(User.active_parking)).scalar() or 0
+
+        if not (occupied == reservations == distinct == user_active == len(booked)):
+            errors.append(f"counters out of sync: spots={occupied} reservations={reservations} "
+                          f"distinct={distinct} users={user_active} booked={len(booked)}")
+        if lot.available_spots != spots - len(booked) or lot.total_parking != len(booked):
+            errors.append(f"lot counters wrong: available={lot.available_spots} total={lot.total_parking}")
+
+    return booked, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spots", type=int, default=200)
+    parser.add_argument("--bookings", type=int, default=300)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=32)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = create_app(make_config(tmp_dir))
+        lot_id, user_ids = seed(app, args.spots, args.users)
+        results, elapsed = run(app, lot_id, user_ids, args.bookings, args.workers)
+        booked, errors = check(app, lot_id, args.spots, results)
+
+    print(f"{args.bookings} attempts, {len(booked)} booked, {args.workers} workers "
+          f"in {elapsed:.2f}s -> {args.bookings / elapsed:.1f} bookings/sec")
+    for error in errors:
+        print("FAIL:", error)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
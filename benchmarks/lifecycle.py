@@ -0,0 +1,208 @@
+"""
+Load test of the whole booking lifecycle, through the real routes.
+
+Seeds lots, spots, users and a reservation history with bulk inserts, then every virtual user runs
+register -> login -> book_lot -> free_reservation -> dashboard / listings / summary, many at a time.
+Reports p50/p95/p99 latency, requests/sec and SQL queries per request for each endpoint and
+writes the numbers to JSON, pass an older file with --compare to see the difference.
+
+run from the project root:
+    python -m benchmarks.lifecycle --lots 20 --spots 200 --users 500 --vusers 100 --workers 16 --out before.json
+    python -m benchmarks.lifecycle ... --out after.json --compare before.json
+"""
+import argparse, json, os, platform, sys, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, insert, select
+from werkzeug.security import generate_password_hash
+
+from application import create_app
+from application.config import TestConfig
+from application.extensions import db
+from application.database.models import User, ParkingLot, Reservation
+from application.services import provisioning, stats
+
+PASSWORD = "bench@123"
+
+_local = threading.local()
+
+
+def make_config(tmp_dir):
+    class BenchConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tmp_dir, 'bench.sqlite3')}"
+        UPLOAD_FOLDER = os.path.join(tmp_dir, "uploads")
+        WTF_CSRF_ENABLED = False
+    return BenchConfig
+
+
+def seed(app, lots, spots, users, history):
+    """Bulk inserts `lots` lots of `spots` spots, `users` users with `history` completed reservations each."""
+    with app.app_context():
+        db.create_all()
+        password = generate_password_hash(PASSWORD)         # hashed once, it is the slow part of creating users
+        db.session.execute(insert(ParkingLot), [
+            dict(name=f"Bench Lot {i}", address=f"{i} Benchmark Road", pincode=f"{110001 + i}",
+                 cost_per_hour=10 + i % 40, max_spots=spots, available_spots=spots) for i in range(lots)
+        ])
+        lot_ids = db.session.scalars(select(ParkingLot.id)).all()
+        for lot_id in lot_ids:
+            provisioning.add_spots(lot_id, range(1, spots + 1))
+
+        db.session.execute(insert(User), [
+            dict(username=f"seed{i}", name=f"Seed {i}", email=f"seed{i}@example.com", phone=f"6{i:09d}",
+                 password=password, gender="o", total_parking=history) for i in range(users)
+        ])
+        user_ids = db.session.scalars(select(User.id)).all()
+
+        now = datetime.utcnow()
+        rows = []
+        for n, user_id in enumerate(user_ids):
+            for h in range(history):
+                start = now - timedelta(days=h + 1, hours=n % 24)
+                rows.append(dict(user_id=user_id, lot_id=lot_ids[(n + h) % len(lot_ids)], spot_number=1 + h % spots,
+                                 vehicle_number=f"SD{n:04d}{h:02d}", cost_per_hr=20, status="C",
+                                 start_time=start, end_time=start + timedelta(hours=1 + h % 5)))
+        if rows:
+            db.session.execute(insert(Reservation), rows)
+        db.session.commit()
+        stats.reconcile()
+        return lot_ids
+
+
+def count_queries(app):
+    with app.app_context():
+        @event.listens_for(db.engine, "before_cursor_execute")
+        def _count(conn, cursor, statement, parameters, context, executemany):
+            _local.queries = getattr(_local, "queries", 0) + 1
+
+
+class VirtualUser:
+    """One browser: its own test client (cookies), timing every request by endpoint name."""
+
+    def __init__(self, app, n, samples):
+        self.app = app
+        self.n = n
+        self.client = app.test_client()
+        self.samples = samples
+
+    def request(self, name, method, url, expect=200, **kwargs):
+        _local.queries = 0
+        start = time.perf_counter()
+        response = getattr(self.client, method)(url, **kwargs)
+        elapsed = time.perf_counter() - start
+        self.samples.append((name, elapsed, _local.queries, response.status_code == expect))
+        return response
+
+    def open_reservation(self):
+        with self.app.app_context():
+            user_id = db.session.scalar(select(User.id).where(User.username == f"bench{self.n}"))
+            return db.session.scalar(select(Reservation.id).where(Reservation.user_id == user_id,
+                                                                   Reservation.status == "O"))
+
+    def run(self, lot_id):
+        username = f"bench{self.n}"
+        self.request("auth.register", "post", "/auth/register", data=dict(
+            username=username, email=f"{username}@example.com", name=f"Bench {self.n}", gender="o",
+            address="Benchmark Road", pincode="110001", phone=f"9{self.n:09d}",
+            password=PASSWORD, confirm_password=PASSWORD), expect=302)
+        self.request("auth.login", "post", "/auth/login", data=dict(id_type="username", id_value=username,
+                                                                    password=PASSWORD), expect=302)
+        self.request("user.dashboard", "get", "/user/dashboard")
+        self.request("user.all_lots", "get", "/user/all_lots")
+        self.request("user.book_lot GET", "get", f"/user/book_lot/{lot_id}")
+        self.request("user.book_lot POST", "post", f"/user/book_lot/{lot_id}",
+                     data=dict(vehicle_number=f"BN{self.n:06d}"), expect=302)
+        reservation_id = self.open_reservation()
+        if reservation_id is not None:
+            self.request("user.free_reservation", "post", f"/user/free_reservation/{reservation_id}", expect=302)
+        self.request("user.all_reservations", "get", "/user/all_reservations")
+        self.request("user.user_summary", "get", "/user/summary")
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def summarize(samples, elapsed):
+    endpoints = {}
+    for name, latency, queries, ok in samples:
+        endpoints.setdefault(name, []).append((latency, queries, ok))
+
+    report = {}
+    for name, rows in endpoints.items():
+        latencies = [r[0] * 1000 for r in rows]
+        report[name] = dict(
+            requests=len(rows),
+            errors=sum(1 for r in rows if not r[2]),
+            rps=round(len(rows) / elapsed, 2),
+            p50_ms=round(percentile(latencies, 50), 2),
+            p95_ms=round(percentile(latencies, 95), 2),
+            p99_ms=round(percentile(latencies, 99), 2),
+            queries_avg=round(sum(r[1] for r in rows) / len(rows), 2),
+        )
+    return report
+
+
+def print_report(report, previous=None):
+    print(f"{'endpoint':<24}{'reqs':>6}{'err':>5}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}")
+    for name, row in report.items():
+        line = (f"{name:<24}{row['requests']:>6}{row['errors']:>5}{row['rps']:>9.1f}{row['p50_ms']:>9.1f}"
+                f"{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['queries_avg']:>9.1f}")
+        old = (previous or {}).get(name)
+        if old:
+            line += f"   p95 {row['p95_ms'] - old['p95_ms']:+.1f}ms, queries {row['queries_avg'] - old['queries_avg']:+.1f}"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lots", type=int, default=20)
+    parser.add_argument("--spots", type=int, default=200, help="spots per lot")
+    parser.add_argument("--users", type=int, default=500, help="seeded users")
+    parser.add_argument("--history", type=int, default=5, help="completed reservations per seeded user")
+    parser.add_argument("--vusers", type=int, default=100, help="virtual users running the lifecycle")
+    parser.add_argument("--workers", type=int, default=16, help="virtual users running at the same time")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare with")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = create_app(make_config(tmp_dir))
+        lot_ids = seed(app, args.lots, args.spots, args.users, args.history)
+        count_queries(app)
+
+        samples = []            # list.append is atomic, shared by all threads
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            list(pool.map(lambda n: VirtualUser(app, n, samples).run(lot_ids[n % len(lot_ids)]), range(args.vusers)))
+        elapsed = time.perf_counter() - start
+
+    report = summarize(samples, elapsed)
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)["endpoints"]
+
+    print(f"{args.vusers} virtual users, {args.workers} at a time, {len(samples)} requests "
+          f"in {elapsed:.2f}s -> {len(samples) / elapsed:.1f} req/sec")
+    print_report(report, previous)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(dict(
+                created_at=datetime.utcnow().isoformat(timespec="seconds"),
+                python=platform.python_version(),
+                params={k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+                elapsed_s=round(elapsed, 3),
+                rps=round(len(samples) / elapsed, 2),
+                endpoints=report,
+            ), f, indent=2)
+        print(f"results written to {args.out}")
+
+    return 1 if any(row["errors"] for row in report.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Multi process read / write throughput of the sqlite PRAGMA profiles in config.SQLITE_PROFILES.
+
+Like gunicorn workers, every process opens its own engine on one shared db file. Writer processes
+book and check out spots through the allocation service, reader processes run the dashboard and
+lot listing queries. Each profile gets a fresh db file, since WAL mode is persisted in the file.
+
+run from the project root:
+    python -m benchmarks.sqlite_profile --readers 4 --writers 4 --seconds 5
+"""
+import argparse, os, sys, tempfile, time
+from multiprocessing import get_context
+
+from sqlalchemy.exc import OperationalError
+
+from application import create_app
+from application.config import TestConfig, SQLITE_PROFILES
+from application.extensions import db
+from application.database.models import User, ParkingLot, ParkingSpot, Reservation
+from application.services import book_spot, checkout
+
+
+def make_config(db_path, profile):
+    class BenchConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+        UPLOAD_FOLDER = os.path.join(os.path.dirname(db_path), "uploads")
+        SQLITE_PRAGMAS = SQLITE_PROFILES[profile]
+    return BenchConfig
+
+
+def seed(app, writers, spots):
+    with app.app_context():
+        db.create_all()
+        lot = ParkingLot(name="Profile Lot", address="Benchmark Road", pincode="110001",
+                         cost_per_hour=20, max_spots=spots, available_spots=spots)
+        db.session.add(lot)
+        db.session.flush()
+        db.session.add_all(ParkingSpot(lot_id=lot.id, spot_number=i, status="A", total_parking=0)
+                           for i in range(1, spots + 1))
+        db.session.add_all(User(username=f"profile{i}", name=f"Profile {i}", email=f"profile{i}@example.com",
+                                phone=f"9{i:09d}", password="x", gender="o")
+                           for i in range(writers))
+        db.session.commit()
+        return lot.id, [u.id for u in User.query.all()]
+
+
+def writer(db_path, profile, lot_id, user_id, start_at, seconds):
+    app = create_app(make_config(db_path, profile))
+    ops = errors = 0
+    with app.app_context():
+        time.sleep(max(0.0, start_at - time.time()))
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            try:
+                checkout(book_spot(lot_id, user_id, f"PF{user_id:06d}"))
+                ops += 2
+            except OperationalError:
+                errors += 1
+    return ops, errors
+
+
+def reader(db_path, profile, lot_id, user_id, start_at, seconds):
+    app = create_app(make_config(db_path, profile))
+    ops = errors = 0
+    with app.app_context():
+        time.sleep(max(0.0, start_at - time.time()))
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            try:
+                ParkingLot.query.filter(ParkingLot.available_spots > 0, ParkingLot.is_active == True).limit(4).all()
+                Reservation.query.filter(Reservation.user_id == user_id).order_by(Reservation.end_time).limit(4).all()
+                Reservation.query.filter_by(lot_id=lot_id, status="O").count()
+                db.session.rollback()           # end the read transaction like a finished request would
+                ops += 3
+            except OperationalError:
+                db.session.rollback()
+                errors += 1
+    return ops, errors
+
+
+def run(profile, readers, writers, seconds):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bench.sqlite3")
+        lot_id, user_ids = seed(create_app(make_config(db_path, profile)), writers, spots=writers * 2)
+
+        start_at = time.time() + 2          # give every process time to import and connect
+        jobs = [(writer, user_ids[i]) for i in range(writers)] + \
+               [(reader, user_ids[i % len(user_ids)]) for i in range(readers)]
+        with get_context("spawn").Pool(len(jobs)) as pool:
+            pending = [(fn, pool.apply_async(fn, (db_path, profile, lot_id, user_id, start_at, seconds)))
+                       for fn, user_id in jobs]
+            results = [(fn, res.get()) for fn, res in pending]
+
+    totals = {}
+    for fn, (ops, errors) in results:
+        done, failed = totals.get(fn.__name__, (0, 0))
+        totals[fn.__name__] = (done + ops, failed + errors)
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--profiles", nargs="+", default=list(SQLITE_PROFILES), choices=list(SQLITE_PROFILES))
+    args = parser.parse_args(argv)
+
+    print(f"{args.readers} reader and {args.writers} writer processes, {args.seconds:g}s per profile")
+    for profile in args.profiles:
+        totals = run(profile, args.readers, args.writers, args.seconds)
+        line = ", ".join(f"{name}s {ops / args.seconds:8.1f} ops/sec ({errors} locked)"
+                         for name, (ops, errors) in sorted(totals.items()))
+        print(f"{profile:>8}: {line}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+// Live availability counts: every element with data-lot-available="<lot id>" is kept up to date
+// from the server-sent events of user.lot_availability_stream, no page reload needed.
+(function () {
+    var script = document.currentScript;
+    var counters = document.querySelectorAll('[data-lot-available]');
+    if (!window.EventSource || !counters.length) return;
+
+    var lots = {};
+    counters.forEach(function (el) { lots[el.dataset.lotAvailable] = true; });
+    var query = Object.keys(lots).map(function (id) { return 'lot=' + encodeURIComponent(id); }).join('&');
+
+    function update(lotId, lot) {
+        document.querySelectorAll('[data-lot-available="' + lotId + '"]').forEach(function (el) {
+            el.textContent = lot.is_active ? lot.available_spots : 'NA';
+        });
+    }
+
+    var source = new EventSource(script.dataset.stream + '?' + query);
+    source.addEventListener('snapshot', function (e) {
+        var snapshot = JSON.parse(e.data);
+        Object.keys(snapshot).forEach(function (lotId) { update(lotId, snapshot[lotId]); });
+    });
+    source.addEventListener('availability', function (e) {
+        var lot = JSON.parse(e.data);
+        update(lot.lot_id, lot);
+    });
+})();
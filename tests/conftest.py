@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from application import create_app
+from application.config import TestConfig
+from application.database.init_db import create_admin
+from application.extensions import MeteredQueuePool
+
+POOL_SIZE = 2
+MAX_OVERFLOW = 1
+
+
+@pytest.fixture
+def config(tmp_path):
+    class Config(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.sqlite3'}"
+        # a small pool which times out fast, so held connections show up as errors
+        SQLALCHEMY_ENGINE_OPTIONS = {"poolclass": MeteredQueuePool, "pool_size": POOL_SIZE,
+                                     "max_overflow": MAX_OVERFLOW, "pool_timeout": 1}
+        UPLOAD_FOLDER = os.fspath(tmp_path / "uploads")
+        WTF_CSRF_ENABLED = False
+        LAST_LOGIN_FLUSH_INTERVAL = 0
+        AVATAR_WORKERS = 0
+
+    return Config
+
+
+@pytest.fixture
+def app(config):
+    app = create_app(config)
+    create_admin(app)
+    return app
+
+
+@pytest.fixture
+def other_app(app, config):
+    """A second instance on the same database, like another gunicorn worker: its own caches, no shared memory."""
+    return create_app(config)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, id_value, password, id_type="username"):
+    return client.post("/auth/login", data=dict(id_type=id_type, id_value=id_value, password=password))
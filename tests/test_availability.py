@@ -0,0 +1,27 @@
+import http.client, threading
+
+from werkzeug.serving import make_server
+
+from .conftest import POOL_SIZE, MAX_OVERFLOW
+
+
+def test_streams_do_not_hold_pooled_connections(app):
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    streams = []
+    try:
+        for _ in range(POOL_SIZE + MAX_OVERFLOW + 3):
+            stream = http.client.HTTPConnection("127.0.0.1", server.port, timeout=5)
+            stream.request("GET", "/user/availability/stream")
+            response = stream.getresponse()
+            assert response.status == 200
+            assert response.readline() == b"event: snapshot\n"     # the stream now waits for changes
+            streams.append(stream)
+
+        normal = http.client.HTTPConnection("127.0.0.1", server.port, timeout=5)
+        normal.request("GET", "/user/availability")
+        assert normal.getresponse().status == 200
+    finally:
+        for stream in streams:
+            stream.close()
+        server.shutdown()
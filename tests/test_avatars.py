@@ -0,0 +1,38 @@
+import io
+
+from PIL import Image
+
+from application.database.models import User
+from application.extensions import db
+
+from .conftest import login
+
+
+def edit_profile(client, upload, name):
+    return client.post("/user/profile/edit", content_type="multipart/form-data", data=dict(
+        name="Himanshu", gender="m", address="Lucknow", pincode="226017", phone="9335354585",
+        email="himanshu@mail.com", avatar=(io.BytesIO(upload), name)))
+
+
+def avatar_url(app):
+    with app.app_context():
+        return db.session.scalar(db.select(User.avatar_url).where(User.username == "himanshu"))
+
+
+def test_non_image_upload_is_rejected_on_the_form(app, client):
+    login(client, "himanshu", "test@123")
+    before = avatar_url(app)
+
+    response = edit_profile(client, b"%PDF-1.4 not a picture", "avatar.png")
+    assert response.status_code == 200
+    assert "Profile picture rejected" in response.get_data(as_text=True)
+    assert avatar_url(app) == before
+
+
+def test_image_upload_is_accepted(app, client):
+    login(client, "himanshu", "test@123")
+    buffer = io.BytesIO()
+    Image.new("RGB", (300, 200), "orange").save(buffer, "PNG")
+
+    assert edit_profile(client, buffer.getvalue(), "avatar.png").location == "/user/profile"
+    assert avatar_url(app).endswith("_256.jpg")         # AVATAR_WORKERS = 0 processes inline
@@ -0,0 +1,21 @@
+from .conftest import login
+
+
+def edit_email(client, email):
+    return client.post("/user/profile/edit", data=dict(
+        name="Himanshu", gender="m", address="Lucknow", pincode="226017", phone="9335354585", email=email))
+
+
+def test_login_after_mixed_case_email_edit(client):
+    assert login(client, "himanshu", "test@123").location == "/user/"
+    assert edit_email(client, "Bob.Smith@Mail.com").status_code == 302
+    client.post("/auth/logout")
+
+    for typed in ("Bob.Smith@Mail.com", "bob.smith@mail.com", "BOB.SMITH@MAIL.COM"):
+        assert login(client, typed, "test@123", id_type="email").location == "/user/", typed
+        client.post("/auth/logout")
+    assert login(client, "Bob.Smith@Mail.com", "wrong", id_type="email").location.endswith("/auth/login")
+
+
+def test_login_username_ignores_case(client):
+    assert login(client, "HimanShu", "test@123").location == "/user/"
@@ -0,0 +1,27 @@
+from .conftest import login
+
+
+def test_lot_list_follows_changes_of_other_workers(app, other_app):
+    worker_a, worker_b = app.test_client(), other_app.test_client()
+    before = worker_b.get("/user/all_lots").get_data(as_text=True)
+    assert worker_b.get("/user/all_lots").get_data(as_text=True) == before      # served from B's cache
+
+    login(worker_a, "himanshu", "test@123")
+    assert worker_a.post("/user/book_lot/1", data=dict(vehicle_number="UP32AB1234")).status_code == 302
+
+    assert worker_b.get("/user/all_lots").get_data(as_text=True) != before
+
+
+def test_revalidation_after_a_change_in_another_worker(app, other_app):
+    worker_a, worker_b = app.test_client(), other_app.test_client()
+    first = worker_b.get("/user/all_lots")
+    assert worker_b.get("/user/all_lots", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+    login(worker_a, "himanshu", "test@123")
+    worker_a.post("/user/book_lot/1", data=dict(vehicle_number="UP32AB1234"))
+
+    changed = worker_b.get("/user/all_lots", headers={"If-None-Match": first.headers["ETag"]})
+    assert changed.status_code == 200 and changed.get_data() != first.get_data()
+    assert worker_b.get("/user/all_lots", headers={"If-None-Match": changed.headers["ETag"]}).status_code == 304
+    # the body stored under the new ETag is the new one, not B's old fragment
+    assert worker_b.get("/user/all_lots").get_data() == changed.get_data()
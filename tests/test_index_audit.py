@@ -0,0 +1,7 @@
+from application.services import index_audit
+
+
+def test_hot_queries_are_index_backed(app):
+    with app.app_context():
+        scans = {name: scans for name, plan, scans in index_audit.audit() if scans}
+    assert scans == {}
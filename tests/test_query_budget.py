@@ -0,0 +1,37 @@
+"""Statement budgets of the hot pages, sql_monitor.query_budget fails a page which grows a query or an N+1."""
+import pytest
+
+from application.services.sql_monitor import query_budget
+
+from .conftest import login
+
+# (login, url, statements, allowed repeats of one statement)
+BUDGETS = [
+    ("himanshu", "/user/", 3, 1),                   # lots stamp, latest reservations with their lots
+    ("himanshu", "/user/all_lots", 2, 1),           # lots stamp, one page of lots
+    ("himanshu", "/user/all_reservations", 3, 1),   # user counters, lots stamp, one page of history with lots
+    ("admin", "/admin/", 3, 1),
+    ("admin", "/admin/all_lots", 2, 1),
+    ("admin", "/admin/all_users", 1, 1),
+    ("admin", "/admin/summary", 3, 1),              # stats row, lots stamp, top lots by revenue
+]
+PASSWORDS = {"himanshu": "test@123", "admin": "admin@123"}
+
+
+@pytest.fixture
+def history(client):
+    """Three reservations in different lots, so a lazy loaded lot per row shows up as a repeated statement."""
+    login(client, "himanshu", "test@123")
+    for lot_id in (1, 2, 3):
+        client.post(f"/user/book_lot/{lot_id}", data=dict(vehicle_number="UP32AB1234"))
+    client.post("/auth/logout")
+
+
+@pytest.mark.parametrize("username, url, statements, repeats", BUDGETS)
+def test_page_query_budget(app, history, username, url, statements, repeats):
+    client = app.test_client()
+    login(client, username, PASSWORDS[username])
+    assert client.get(url).status_code == 200           # warm up: user cache, stats row
+
+    with query_budget(statements, allow_repeats=repeats):
+        assert client.get(url).status_code == 200
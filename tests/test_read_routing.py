@@ -0,0 +1,24 @@
+import sqlite3
+
+from application import create_app
+from application.config import SQLITE_PROFILES, replica_bind, sqlite_read_only
+from application.extensions import db
+
+
+def test_read_only_replica_on_a_rollback_journal_file(app, config, tmp_path):
+    path = tmp_path / "test.sqlite3"
+    with app.app_context():
+        db.engine.dispose()         # WAL can only be left without other connections
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("PRAGMA journal_mode=DELETE").fetchone() == ("delete",)
+
+    class ReplicaConfig(config):
+        SQLITE_PRAGMAS = SQLITE_PROFILES["tuned"]
+        SQLALCHEMY_BINDS = replica_bind(sqlite_read_only(path))
+
+    try:
+        # the replica opens the file first, it must not try to switch it to WAL
+        assert create_app(ReplicaConfig).test_client().get("/user/all_lots").status_code == 200
+    finally:
+        # the bind's metadata is registered on the shared db object, apps without the bind can't create_all with it
+        db.metadatas.pop("replica", None)
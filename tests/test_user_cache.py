@@ -0,0 +1,35 @@
+from application.database.models import User
+from application.extensions import db
+
+from .conftest import login
+
+
+def book_elsewhere(app):
+    worker_a = app.test_client()
+    login(worker_a, "himanshu", "test@123")
+    assert worker_a.post("/user/book_lot/1", data=dict(vehicle_number="UP32AB1234")).status_code == 302
+
+
+def test_delete_account_sees_a_booking_made_in_another_worker(app, other_app):
+    worker_b = other_app.test_client()
+    login(worker_b, "himanshu", "test@123")
+    assert worker_b.get("/user/").status_code == 200        # himanshu is now in B's user cache
+
+    book_elsewhere(app)
+
+    assert worker_b.post("/user/delete_account", data=dict(confirm_delete="1")).location == "/user/profile"
+    with app.app_context():
+        assert db.session.scalar(db.select(User.is_active).where(User.username == "himanshu"))
+
+
+def test_reservation_history_etag_sees_a_booking_made_in_another_worker(app, other_app):
+    worker_b = other_app.test_client()
+    login(worker_b, "himanshu", "test@123")
+    etag = worker_b.get("/user/all_reservations").headers["ETag"]
+
+    book_elsewhere(app)
+
+    response = worker_b.get("/user/all_reservations", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    # the booking is ongoing, its cost keeps growing: no validator, so never a 304
+    assert "ETag" not in response.headers